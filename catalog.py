@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from functions import conv_rasc_decl_arrays
+from parallel_transform import ParallelTransform
+
+class PackedStrings:
+    def __init__(self, values):
+        '''
+        Column of strings packed into one utf-8 buffer with an offsets array,
+        instead of one Python string object per star.
+        Missing values (NaN in the csv) come back out as None.
+        '''
+        values = list(values)
+        self.missing = np.array([not isinstance(v, str) for v in values], dtype = bool)
+        encoded = [v.encode('utf8') if isinstance(v, str) else b'' for v in values]
+
+        lengths = np.fromiter((len(b) for b in encoded), dtype = np.int64, count = len(encoded))
+        self.offsets = np.zeros(len(encoded) + 1, dtype = np.int64)
+        np.cumsum(lengths, out = self.offsets[1:])
+        if self.offsets[-1] < np.iinfo(np.int32).max:
+            self.offsets = self.offsets.astype(np.int32)
+        self.buffer = b''.join(encoded)
+
+    def __len__(self):
+        return len(self.missing)
+
+    def __getitem__(self, i):
+        if self.missing[i]:
+            return None
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].decode('utf8')
+
+    def take(self, indices):
+        return [self[i] for i in indices]
+
+    def nbytes(self):
+        return len(self.buffer) + self.offsets.nbytes + self.missing.nbytes
+
+class StarCatalog:
+    def __init__(self, df):
+        '''
+        Compact, column-wise version of the star dataset.
+        Numbers are float32 arrays, constellations are categorical, and the text columns
+        are packed. A DataFrame is only built for the rows a chart actually needs (see frame).
+        '''
+        self.size = len(df)
+        self.index = df.index.to_numpy()
+
+        # Ingested catalogs already have degree columns, older csvs still need the strings parsed
+        if 'ra_deg' in df.columns and 'dec_deg' in df.columns:
+            ra, dec = df['ra_deg'].to_numpy(), df['dec_deg'].to_numpy()
+        else:
+            ra, dec = conv_rasc_decl_arrays(df['right_ascension'], df['declination'])
+        self.ra = np.ascontiguousarray(ra, dtype = np.float32)
+        self.dec = np.ascontiguousarray(dec, dtype = np.float32)
+        self.mag = df['apparent_magnitude'].to_numpy(dtype = np.float32)
+        # Numeric copy for anything that needs numbers. Some distances aren't plain numbers ('4,659', '~20000', '>3000'),
+        # so the text is kept as well and that's what frame and the hover text use
+        self.dist = pd.to_numeric(df['distance (ly)'], errors = 'coerce').to_numpy(dtype = np.float32)
+        self.dist_strings = PackedStrings(v if isinstance(v, str) or pd.isna(v) else f'{v:g}' for v in df['distance (ly)'])
+
+        self.constellations = pd.Categorical(df['parent_constellation'])
+        self.names = PackedStrings(df['name'])
+        self.links = PackedStrings(df['link'])
+        self.ra_strings = PackedStrings(df['right_ascension'])
+        self.dec_strings = PackedStrings(df['declination'])
+
+        # Set by use_parallel, construct_table uses it when it's there
+        self.engine = None
+
+    def __len__(self):
+        return self.size
+
+    def use_parallel(self, workers = None, min_stars = 500_000):
+        '''
+        Makes construct_table transform this catalog across a process pool.
+        Smaller catalogs than min_stars still run in process.
+        '''
+        if self.engine is not None:
+            self.engine.close()
+        self.engine = ParallelTransform(self.ra, self.dec, workers = workers, min_stars = min_stars)
+        return self.engine
+
+    def constellation_mask(self, constellation):
+        return np.asarray(self.constellations == constellation)
+
+    def frame(self, indices, **columns):
+        '''
+        Builds a DataFrame for the given row positions with the same columns as the csv,
+        plus any extra array columns passed in (X, Y, ...).
+        '''
+        indices = np.asarray(indices)
+        df = pd.DataFrame({
+            'name': self.names.take(indices),
+            'right_ascension': self.ra_strings.take(indices),
+            'declination': self.dec_strings.take(indices),
+            'apparent_magnitude': self.mag[indices],
+            'distance (ly)': self.dist_strings.take(indices),
+            'link': self.links.take(indices),
+            'parent_constellation': self.constellations[indices],
+            }, index = self.index[indices])
+
+        for column, values in columns.items():
+            df[column] = values
+        return df
+
+    def memory_report(self):
+        '''
+        Bytes used by each part of the catalog, plus the total
+        '''
+        report = {'ra': self.ra.nbytes,
+                  'dec': self.dec.nbytes,
+                  'apparent_magnitude': self.mag.nbytes,
+                  'distance (ly)': self.dist.nbytes + self.dist_strings.nbytes(),
+                  'parent_constellation': self.constellations.codes.nbytes + int(self.constellations.categories.memory_usage(deep = True)),
+                  'name': self.names.nbytes(),
+                  'link': self.links.nbytes(),
+                  'right_ascension': self.ra_strings.nbytes(),
+                  'declination': self.dec_strings.nbytes(),
+                  'index': self.index.nbytes,
+                  }
+        report['total'] = sum(report.values())
+        return report
+
+def print_memory_report(df, catalog):
+    frame_bytes = int(df.memory_usage(deep = True).sum())
+    report = catalog.memory_report()
+
+    print(f'{len(catalog)} stars')
+    for part, size in report.items():
+        print(f'{part:>22}: {size / 1024:10.1f} KiB')
+    print(f'{"DataFrame":>22}: {frame_bytes / 1024:10.1f} KiB')
+    print(f'{"ratio":>22}: {frame_bytes / report["total"]:10.1f}x smaller')
+
+if __name__ == '__main__':
+    import os
+    path = os.path.dirname(os.path.realpath(__file__))
+    stars = pd.read_csv(path + '/datasets/star_data_clean.csv')
+    print_memory_report(stars, StarCatalog(stars))
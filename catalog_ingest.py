@@ -0,0 +1,156 @@
+'''
+Builds datasets/star_data_clean.csv from the scraped datasets/star_data.csv.
+This does the same cleaning as the Data Cleaning part of wikiscrape.ipynb, but also
+parses and checks every right ascension/declination up front, drops duplicates,
+and writes the rows it couldn't use to a rejected rows report.
+
+Parsed rows are remembered in a manifest keyed by a hash of the raw row,
+so rebuilding after the raw csv changes only reprocesses the rows that changed.
+
+Usage: python catalog_ingest.py [--full] [--workers N]
+'''
+import os
+import re
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from functions import conv_rasc_decl
+
+path = os.path.dirname(os.path.realpath(__file__))
+datasets = path + '/datasets/'
+
+columns = ['name', 'right_ascension', 'declination', 'apparent_magnitude', 'distance (ly)', 'link', 'parent_constellation']
+
+# Same cutoff as the notebook, nothing dimmer than this is ever charted
+max_magnitude = 8
+
+def row_hash(row):
+    return hashlib.sha1('\x1f'.join(row).encode('utf8')).hexdigest()
+
+def clean_magnitude(am):
+    # Wikipedia uses a unicode minus and sometimes ~ or n/a
+    am = am.replace('−', '-').replace('~', '').replace('n/a', '')
+    match = re.search(r'[-+]?\d*\.\d+|\d+', am)
+    if match is None:
+        return None
+    return float(match.group())
+
+def parse_row(row):
+    '''
+    Cleans and checks one raw row.
+    Returns a dict with a status of 'ok', 'dim' (too faint to keep), or 'rejected' with a reason.
+    '''
+    name, ra, dec, am, dist, link, constellation = row
+
+    am = clean_magnitude(am)
+    if am is None:
+        return {'status': 'rejected', 'reason': 'missing apparent magnitude'}
+    if am >= max_magnitude:
+        return {'status': 'dim'}
+
+    dec = dec.replace('−', '-').replace("'", '′').replace('"', '″')
+    try:
+        ra_deg, dec_deg = conv_rasc_decl(ra, dec)
+    except (ValueError, IndexError):
+        return {'status': 'rejected', 'reason': 'unreadable right ascension/declination'}
+
+    if not 0 <= ra_deg < 360:
+        return {'status': 'rejected', 'reason': 'right ascension out of range'}
+    if not -90 <= dec_deg <= 90:
+        return {'status': 'rejected', 'reason': 'declination out of range'}
+
+    return {'status': 'ok', 'declination': dec, 'apparent_magnitude': am,
+            'ra_deg': ra_deg, 'dec_deg': dec_deg}
+
+def parse_chunk(rows):
+    return [parse_row(row) for row in rows]
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding = 'utf8') as file:
+        return json.load(file)
+
+def ingest(raw_path, out_path, rejected_path, manifest_path, workers = None, chunk_size = 1000, full = False):
+    '''
+    Runs the whole ingest and returns a dict of counts
+    '''
+    raw = pd.read_csv(raw_path, dtype = str, keep_default_na = False)
+    rows = [tuple(r) for r in raw[columns].itertuples(index = False)]
+    hashes = [row_hash(row) for row in rows]
+
+    manifest = {} if full else load_manifest(manifest_path)
+
+    # Only rows we haven't seen before get parsed, split up into chunks across processes
+    todo = sorted({h: i for i, h in enumerate(hashes) if h not in manifest}.values())
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    if chunks:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            results = executor.map(parse_chunk, [[rows[i] for i in chunk] for chunk in chunks])
+            for chunk, parsed in zip(chunks, results):
+                for i, result in zip(chunk, parsed):
+                    manifest[hashes[i]] = result
+
+    clean = []
+    rejected = []
+    seen = set()
+    for i, (row, h) in enumerate(zip(rows, hashes)):
+        result = manifest[h]
+        if result['status'] == 'dim':
+            continue
+        if result['status'] == 'rejected':
+            rejected.append((i, result['reason']) + row)
+            continue
+
+        # Duplicates are the same star listed twice, same name and same position
+        key = (row[0], result['ra_deg'], result['dec_deg'])
+        if key in seen:
+            rejected.append((i, 'duplicate') + row)
+            continue
+        seen.add(key)
+
+        name, ra, _, _, dist, link, constellation = row
+        clean.append({'index': i, 'name': name, 'right_ascension': ra, 'declination': result['declination'],
+                      'apparent_magnitude': result['apparent_magnitude'], 'distance (ly)': dist,
+                      'link': link, 'parent_constellation': constellation,
+                      'ra_deg': result['ra_deg'], 'dec_deg': result['dec_deg']})
+
+    clean_df = pd.DataFrame(clean, columns = ['index'] + columns + ['ra_deg', 'dec_deg']).set_index('index')
+    clean_df.index.name = None
+    # Blank strings go back to being empty cells, like the notebook's output
+    clean_df = clean_df.replace({'': None})
+    clean_df.to_csv(out_path)
+
+    rejected_df = pd.DataFrame(rejected, columns = ['row', 'reason'] + columns)
+    rejected_df.to_csv(rejected_path, index = False)
+
+    # Rows that are no longer in the raw csv are dropped from the manifest
+    current = set(hashes)
+    manifest = {h: result for h, result in manifest.items() if h in current}
+    with open(manifest_path, 'w', encoding = 'utf8') as file:
+        json.dump(manifest, file)
+
+    return {'rows': len(rows), 'processed': len(todo), 'clean': len(clean_df), 'rejected': len(rejected_df)}
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Build the clean star catalog from the scraped csv.')
+    parser.add_argument('--raw', default = datasets + 'star_data.csv')
+    parser.add_argument('--out', default = datasets + 'star_data_clean.csv')
+    parser.add_argument('--rejected', default = datasets + 'star_data_rejected.csv')
+    parser.add_argument('--manifest', default = datasets + 'star_data_manifest.json')
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--chunk-size', type = int, default = 1000)
+    parser.add_argument('--full', action = 'store_true', help = 'ignore the manifest and reprocess every row')
+    args = parser.parse_args()
+
+    counts = ingest(args.raw, args.out, args.rejected, args.manifest, workers = args.workers,
+                    chunk_size = args.chunk_size, full = args.full)
+    print(f"{counts['rows']} rows, {counts['processed']} processed, "
+          f"{counts['clean']} kept, {counts['rejected']} rejected (see {args.rejected})")
+
+if __name__ == '__main__':
+    main()
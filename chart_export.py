@@ -0,0 +1,101 @@
+import os
+import re
+import queue
+import threading
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+export_formats = ['PNG', 'SVG', 'PDF']
+export_dpis = ['100', '200', '300', '600']
+export_sizes = ['4', '8', '12', '24']
+
+# Matplotlib's font cache and text layout aren't thread safe. Off screen renders (exports, the chart server)
+# and the GUI's full canvas draws all take this lock, so only one figure is drawn at a time.
+# A big export can hold it for seconds, so the GUI never blocks on it (see GUI.draw_canvas)
+render_lock = threading.Lock()
+
+def chart_snapshot(map, limits = None, kind = 'current'):
+    '''
+    Copies everything render_chart needs out of a LocStarMap.
+    Made on the thread that owns the map (the Tk thread for the GUI), so live mode and
+    projection switches can't change the tables while another thread renders them.
+    limits is the (xlim, ylim) of the on screen chart, so zooming carries over.
+    The constellation lines are copied if they're showing.
+    kind is 'current' or 'stored', so a stored chart never gets the same file name as the current one.
+    '''
+    lines = getattr(map, 'lines', None)
+    return {'map': map,
+            'stardf': map.stardf.copy(),
+            'style': dict(map.style),
+            'highlights': [dict(highlight, df = highlight['df'].copy()) for highlight in map.highlights],
+            'lines': [segment.copy() for segment in lines.get_segments()] if lines is not None and lines.get_visible() else None,
+            'title': map.chart_title(),
+            'label': f"{map.address} {map.dt.strftime('%Y-%m-%d')} {map.time}",
+            'limits': limits,
+            'kind': kind}
+
+def export_filename(snapshot, fmt):
+    '''
+    File name made from the chart's location, date, and time.
+    The stored chart can have the same inputs as the current one (stored before a projection
+    or magnitude change), so its name ends in _stored.
+    '''
+    label = re.sub(r'[^A-Za-z0-9]+', '_', snapshot['label']).strip('_')
+    suffix = '' if snapshot['kind'] == 'current' else f"_{snapshot['kind']}"
+    return f'star_chart_{label}{suffix}.{fmt.lower()}'
+
+def render_chart(snapshot, size = 8, dpi = 300):
+    '''
+    Draws a chart_snapshot onto a new Agg figure.
+    The figure is not attached to pyplot or Tkinter, and nothing on the map is changed,
+    so this can run off the main thread (while holding render_lock).
+    '''
+    fig = Figure(figsize = (size, size), dpi = dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    map = snapshot['map']
+    map.draw_chart(fig, ax, snapshot['stardf'], title = snapshot['title'], **snapshot['style'])
+    for highlight in snapshot['highlights']:
+        map.draw_highlight(ax, **highlight)
+    if snapshot['lines'] is not None:
+        ax.add_collection(map.line_collection(snapshot['lines']))
+
+    if snapshot['limits'] is not None:
+        ax.set_xlim(snapshot['limits'][0])
+        ax.set_ylim(snapshot['limits'][1])
+    return fig
+
+class ChartExporter(threading.Thread):
+    def __init__(self, snapshots, folder, fmt = 'PNG', size = 8, dpi = 300):
+        '''
+        Background thread that renders and saves one file per chart.
+        snapshots is a list of chart_snapshot dicts, made on the Tk thread. Progress is put on the progress queue
+        as (fraction done, message) tuples, with None as the message once everything is done.
+        '''
+        super().__init__(daemon = True)
+        self.snapshots = snapshots
+        self.folder = folder
+        self.fmt = fmt
+        self.size = size
+        self.dpi = dpi
+        self.progress = queue.Queue()
+        self.saved = []
+        self.errors = []
+
+    def run(self):
+        total = len(self.snapshots)
+        for i, snapshot in enumerate(self.snapshots):
+            path = os.path.join(self.folder, export_filename(snapshot, self.fmt))
+            try:
+                with render_lock:
+                    fig = render_chart(snapshot, size = self.size, dpi = self.dpi)
+                    fig.savefig(path, format = self.fmt.lower(), dpi = self.dpi, facecolor = fig.get_facecolor())
+                self.saved.append(path)
+                self.progress.put(((i + 1) / total, f'Saved {os.path.basename(path)}'))
+            except Exception as error:
+                self.errors.append((path, error))
+                self.progress.put(((i + 1) / total, f'Could not save {os.path.basename(path)}'))
+
+        self.progress.put((1, None))
@@ -0,0 +1,215 @@
+'''
+Small local HTTP service that serves Sky Atlas charts to other tools.
+
+GET /chart?lat=42.09&lon=-75.97&datetime=2026-10-19T21:30&am=6&constellation=Orion&format=png
+    lat/lon        coordinates (or address=..., which needs the geocoding api)
+    datetime       ISO format, local time of this machine if no offset is given (default: now)
+    am             limiting apparent magnitude (default: 6)
+    constellation  constellation to highlight (optional)
+    format         png or json (default: png)
+    size, dpi      png size in inches and dpi (default: 8 and 100)
+    projection     Orthographic, Stereographic, or Equal Area (default: Orthographic)
+    lines          1 to draw the constellation lines on png charts, 0 to leave them off (default: 1)
+
+json responses list every visible star with its X/Y, alt/az, name, and magnitude.
+With lat/lon given nothing is fetched from the internet, so it works offline.
+
+Usage: python chart_server.py [--port 8151] [--workers 4]
+'''
+import os
+import json
+import argparse
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from classes import *
+from geocoding import GeocodingError
+
+path = os.path.dirname(os.path.realpath(__file__))
+directory = path + '/datasets/star_data_clean.csv'
+
+class ChartRequestError(Exception):
+    pass
+
+class ChartService:
+    def __init__(self, catalog, workers = 4, cache_size = 256):
+        '''
+        Computes and renders charts on a bounded pool of worker threads.
+        Identical requests that arrive while one is already being worked on share its result,
+        and finished responses are kept in a least recently used cache.
+        '''
+        self.catalog = catalog
+        self.segments = load_segments(catalog)
+        self.executor = ThreadPoolExecutor(max_workers = workers)
+        self.table_cache = TableCache()
+        self.cache_size = cache_size
+        self.responses = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def parse_params(self, query):
+        '''
+        Turns the query string into a request key. Everything that changes the response is in the key.
+        '''
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        try:
+            if 'lat' in params and 'lon' in params:
+                lat, lon = float(params['lat']), float(params['lon'])
+                label = params.get('address', f'{lat:.4f}, {lon:.4f}')
+            elif 'address' in params:
+                try:
+                    lat, lon = geocode_address(params['address'])
+                except (GeocodingError, requests.RequestException) as error:
+                    raise ChartRequestError(f"couldn't find {params['address']}: {error}")
+                label = params['address']
+            else:
+                raise ChartRequestError('lat and lon, or address, are required')
+
+            dt = datetime.fromisoformat(params['datetime']) if 'datetime' in params else datetime.now()
+            am = float(params.get('am', 6))
+            size = float(params.get('size', 8))
+            dpi = int(params.get('dpi', 100))
+            lines = int(params.get('lines', 1)) == 1
+        except (ValueError, IndexError, KeyError) as error:
+            raise ChartRequestError(f'bad parameters: {error}')
+
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ChartRequestError('lat must be between -90 and 90 and lon between -180 and 180')
+
+        projection = params.get('projection', 'Orthographic')
+        if projection not in projections:
+            raise ChartRequestError(f"projection must be one of {', '.join(projections)}")
+
+        fmt = params.get('format', 'png').lower()
+        if fmt not in ('png', 'json'):
+            raise ChartRequestError('format must be png or json')
+        if not (0 < size <= 40 and 0 < dpi <= 600):
+            raise ChartRequestError('size must be at most 40 inches and dpi at most 600')
+
+        # The map is built from the UTC time, so requests for the same instant in different
+        # offsets get the same date in the title and the same LST, and can share a response
+        dt = dt.astimezone(timezone.utc)
+        # Like the app, everything happens at minute resolution
+        minute = dt.strftime('%Y-%m-%d %H:%M')
+        # The label is in the chart's title, so the same coords under another name are a different response
+        key = (round(lat, 4), round(lon, 4), minute, am, params.get('constellation'), projection, fmt,
+               size if fmt == 'png' else None, dpi if fmt == 'png' else None, lines if fmt == 'png' else None, label)
+        return key, {'label': label, 'lat': lat, 'lon': lon, 'dt': dt}
+
+    def get(self, query):
+        '''
+        Returns (content type, body) for a query string
+        '''
+        key, extra = self.parse_params(query)
+
+        with self.lock:
+            if key in self.responses:
+                self.responses.move_to_end(key)
+                return self.responses[key]
+
+            future = self.in_flight.get(key)
+            if future is None:
+                future = self.executor.submit(self.build, key, extra)
+                self.in_flight[key] = future
+
+        try:
+            response = future.result()
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+        with self.lock:
+            self.responses[key] = response
+            self.responses.move_to_end(key)
+            while len(self.responses) > self.cache_size:
+                self.responses.popitem(last = False)
+        return response
+
+    def build(self, key, extra):
+        _, _, _, am, constellation, projection, fmt, size, dpi, lines, _ = key
+
+        map = LocStarMap(extra['label'], extra['dt'], coords = (extra['lat'], extra['lon']))
+        table = self.table_cache.get_table(map, self.catalog, am).reset_index()
+        map.projection = projection
+        if projection != 'Orthographic':
+            map.apply_projection(table)
+        stardf = map.set_chart_data(table)
+
+        if constellation is not None:
+            highlighted = stardf.loc[stardf['parent_constellation'] == constellation]
+            map.highlights.append({'df': highlighted, 'color': 'red', 'size_mult': 2, 'z': 100})
+
+        if fmt == 'json':
+            # stardf also has the stars below the horizon, with NaN coords
+            visible = stardf.loc[stardf['X'].notna()]
+            stars = [{'name': name, 'apparent_magnitude': float(mag), 'parent_constellation': pc,
+                      'X': float(x), 'Y': float(y), 'alt': float(alt), 'az': float(az)}
+                     for name, mag, pc, x, y, alt, az in zip(visible['name'], visible['apparent_magnitude'],
+                                                            visible['parent_constellation'], visible['X'], visible['Y'],
+                                                            visible['alt'], visible['az'])]
+            body = {'title': map.chart_title(),
+                    'lat': map.lat, 'lon': map.lon, 'lst': map.lst, 'stars': stars}
+            return 'application/json', json.dumps(body).encode('utf8')
+
+        # Matplotlib's font cache isn't thread safe, so only one png is drawn at a time
+        snapshot = chart_snapshot(map)
+        if lines:
+            snapshot['lines'] = horizon_segments(stardf, *segment_rows(stardf, self.segments), projection)
+        with render_lock:
+            fig = render_chart(snapshot, size = size, dpi = dpi)
+            buffer = BytesIO()
+            fig.savefig(buffer, format = 'png', dpi = dpi, facecolor = fig.get_facecolor())
+        return 'image/png', buffer.getvalue()
+
+def make_handler(service):
+    class ChartHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/chart':
+                return self.respond(404, 'text/plain', b'not found')
+            try:
+                content_type, body = service.get(url.query)
+            except ChartRequestError as error:
+                return self.respond(400, 'text/plain', str(error).encode('utf8'))
+            except Exception as error:
+                return self.respond(500, 'text/plain', str(error).encode('utf8'))
+            self.respond(200, content_type, body)
+
+        def respond(self, code, content_type, body):
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ChartHandler
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Serve Sky Atlas charts over HTTP.')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8151)
+    parser.add_argument('--workers', type = int, default = 4)
+    parser.add_argument('--cache-size', type = int, default = 256)
+    parser.add_argument('--catalog', default = directory)
+    parser.add_argument('--parallel', action = 'store_true', help = 'transform large catalogs across a process pool')
+    args = parser.parse_args()
+
+    catalog = StarCatalog(pd.read_csv(args.catalog))
+    if args.parallel:
+        catalog.use_parallel()
+    service = ChartService(catalog, workers = args.workers, cache_size = args.cache_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f'Serving charts on http://{args.host}:{args.port}/chart')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,28 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.backends._backend_tk import add_tooltip
-import mplcursors
+from matplotlib.collections import LineCollection
 
 import time
 
 import tkinter as tk
+from tkinter import filedialog
 import customtkinter as ctk
 import CTkMessagebox
 import CTkSpinbox
 
 from functions import *
+from catalog import *
 from mpl_event_funcs import *
 from light_pollution_locator import *
+from chart_export import *
+from table_cache import *
+from preview_render import *
+from star_search import *
+from constellation_lines import *
+from horizon_profile import *
+from night_planner import *
+from session_snapshot import *
 
 from PIL import Image, ImageTk
 from io import BytesIO
@@ -27,6 +37,8 @@ lbg = "#454b87"
 lfg = "#595e99"
 mfg = "#7f81b5"
 font = ("Arial Rounded MT Bold", 15)
+# Charts with at least this many visible stars show a raster preview while the real chart is built
+preview_min_stars = 2000
 # Setting fonts in mpl: https://matplotlib.org/stable/users/explain/text/text_props.html
 mpl.rcParams['font.family'] = "Arial Rounded MT Bold"
 mpl.rcParams['text.color'] = "white"
@@ -46,16 +58,20 @@ toolitems = (
 
 
 class LocStarMap:
-    def __init__(self, address, dt, highlight = False, time = None):
+    def __init__(self, address, dt, highlight = False, time = None, coords = None):
         
         '''
         A class for a star map
         Has the attributes address, datetime, coordinates, and local siderial time.
+        If coords (lat, lon) are given, the address is only used as a label and nothing is geocoded.
         '''
         self.address = address
         
         try:
-            self.lat, self.lon = geocode_address(address)
+            if coords is None:
+                self.lat, self.lon = geocode_address(address)
+            else:
+                self.lat, self.lon = float(coords[0]), float(coords[1])
             self.status_code = '200'
         except:
             self.status_code = '404'
@@ -63,6 +79,9 @@ class LocStarMap:
         
         self.dt = dt
         self.highlight = highlight
+        self.projection = 'Orthographic'
+        # Horizon profile loaded for this site, if there is one
+        self.horizon = site_profile(self.lat, self.lon)
         print(self.lat, self.lon)
         
         # Converts the timezone to UTC
@@ -79,62 +98,94 @@ class LocStarMap:
         Method to construct the table with x,y coordinates.
         Used by the next method to plot our coords on a map.
         Optionally, includes a limiting apparent magnitude
+        Takes a StarCatalog (a DataFrame also works, but gets converted every call)
         '''
-        df = df.loc[df['apparent_magnitude'] < am].copy()
-
-        X = []
-        Y = []
-        
-        # Loops through right ascensions and declinations in our dataset
-        for ra, dec in zip(df['right_ascension'], df['declination']):
-            # Degree conversion
-            degra, degdec = conv_rasc_decl(ra, dec)
-            
-            # Hours angle calculation
-            ha = hour_angle(self.lst, degra)
-            
-            # Altitude and Azimuth Calculation
-            alt, az = az_alt_calc(degdec, ha, self.lat)
-            
-            # Conversion to the cartesian plane
-            try:
-                x,y = cartesian_conversion(alt, az)
-            
-            # If we get an arccos/arcsin that is not in its domain, sets x and y to none
-            except ValueError:
-                x = None
-                y = None
-                
-            X.append(x)
-            Y.append(y)
-        
-        # Creating X and Y Columns
-        df['X'] = X
-        df['Y'] = Y
+        if isinstance(df, pd.DataFrame):
+            df = StarCatalog(df)
         
+        # Only the stars bright enough to show up are transformed
+        indices = np.flatnonzero(df.mag < am)
         
-        # Returns the dataframe with the x,y coords
-        return df
+        # Hour angle, altitude/azimuth, and then the cartesian plane, for every star at once
+        if df.engine is not None:
+            X, Y, alt, az = df.engine.transform(self.lst, self.lat, indices)
+        else:
+            ha = hour_angle_arrays(self.lst, df.ra[indices])
+            alt, az = az_alt_calc_arrays(df.dec[indices], ha, self.lat)
+            X, Y = cartesian_conversion_arrays(alt, az)
+        
+        # Returns the dataframe with the x,y coords. Stars that can't be seen have NaN coords
+        # alt and az are kept (in degrees) for anything that needs more than the x,y coords
+        return df.frame(indices, X = X.astype(np.float32), Y = Y.astype(np.float32),
+                        ra_deg = df.ra[indices], dec_deg = df.dec[indices],
+                        alt = np.degrees(alt).astype(np.float32), az = az.astype(np.float32))
     
     def plot_stars(self, df, color = 'white', z = 1, size_mult = 1):
         '''
         Method that plots stars using Matplotlib
         '''
-        # Checks where both X and Y are nonzero, meaning they can be seen
-        stardf = df.loc[(df['X'] != 100) & (df['Y'] != 100)]    
-        
-        stardf.reset_index(inplace = True)
+        stardf = self.set_chart_data(df, color = color, z = z, size_mult = size_mult)
         
         fig, ax = plt.subplots()
+        fig.set_size_inches(4,4)
+        self.title = self.chart_title()
+        scatter, important = self.draw_chart(fig, ax, stardf, color = color, z = z, size_mult = size_mult, title = self.title)
+        
+        # Connections within mpl events take lambdas with a single arg
+        # Since the functions in mpl_event_funcs.py take 2 kwargs, we need to specify them
+        # This assigns the kwargs and creates lambda func with no kwargs
+        # The hover text and urls are built once here instead of inside every event
+        self.lookup = build_lookup(stardf)
+        onclick2 = lambda event: onclick(event, plot = scatter, lookup = self.lookup)
+        
+        # Hovering only blits the annotation over a saved copy of the chart (see HoverLayer)
+        cursor = HoverLayer(fig, ax, scatter, self.lookup)
+        
+        cid_click = fig.canvas.mpl_connect('button_press_event', onclick2)
+        
+        self.fig = fig
+        self.ax = ax
+        self.scatter = scatter
+        self.important = important
+        self.cursor = cursor
+        self.search_marker = None
+        self.search_row = None
+        self.lines = None
         
+        # Method returns self
+        return self
+    
+    def set_chart_data(self, df, color = 'white', z = 1, size_mult = 1):
+        '''
+        Keeps the stars and styling so the chart can be drawn later,
+        on screen or on another figure (exports, the chart server, etc.)
+        Stars below the horizon stay in with NaN coords, so live mode and projection switches
+        can show them once they rise. Only stars that never rise at this latitude are left out.
+        '''
+        rises = (df['dec_deg'] - self.lat).abs() <= 90
+        stardf = df.loc[rises].reset_index()
+        
+        self.stardf = stardf
+        self.style = {'color': color, 'z': z, 'size_mult': size_mult}
+        self.highlights = []
+        self.highlight_artists = []
+        return stardf
+    
+    def chart_title(self):
+        return f"Star Chart of {self.address} at {self.time} UTC on {self.dt.strftime('%B %d, %Y')}"
+    
+    def draw_chart(self, fig, ax, stardf, color = 'white', z = 1, size_mult = 1, title = None):
+        '''
+        Draws the styled star chart onto any figure and axis.
+        Used for the on screen chart and for re-rendering it on other figures, so it doesn't change the map.
+        Returns the scatter of all stars and the scatter of the bright ones.
+        '''
         # STARMAP STYLING GOES HERE
-        fig.set_size_inches(4,4)
         fig.patch.set_facecolor(fg)
         
         x = stardf['X']
         y = stardf['Y']
-        self.title = f"Star Chart of {self.address} at {self.time} UTC on {self.dt.strftime('%B %d, %Y')}"
-        ax.set_title(self.title, fontdict = {'fontsize': 22}, wrap = True, pad = 40)
+        ax.set_title(title or self.chart_title(), fontdict = {'fontsize': 22}, wrap = True, pad = 40)
         
         # Highlighting Polaris, just to check for accuracy right now
         #polaris = df.loc[df['name'] == 'Polaris']
@@ -142,15 +193,15 @@ class LocStarMap:
             #plt.scatter(polaris['X'], polaris['Y'], color = 'yellow', s = 20, picker = True)
         
         # Making the background black
-        fig.gca().set_facecolor("black")
+        ax.set_facecolor("black")
         
         box = (-1,1)
         ax.set_ylim(box)
         ax.set_xlim(box)
         
         # Removing both x and y ticks
-        fig.gca().set_xticks([])
-        fig.gca().set_yticks([])
+        ax.set_xticks([])
+        ax.set_yticks([])
         
         # Creating a scatterplot of our stars
         scatter = ax.scatter(x, y, s = (stardf['apparent_magnitude'].abs() * 2 * size_mult),
@@ -195,63 +246,182 @@ class LocStarMap:
         ax3.xaxis.label.set_color('white')
         ax3.yaxis.label.set_color('white')
         
-        '''
-        The following code utilizes the mplcursors library.
-        More information can be found at: https://mplcursors.readthedocs.io/en/stable/
-        '''
-          
-        # Creating a cursor object which makes the scatterplot a pickupable
-        # Also setting hover to make the following function run when the mouse hovers over a datapoint
-        # More info on the cursor object here: https://mplcursors.readthedocs.io/en/stable/mplcursors.html#mplcursors.cursor
-        cursor = mplcursors.cursor(scatter, hover = True)
-        
-        # Connections within mpl events and mplcursors both take lambdas with a single arg
-        # Since the functions in mpl_event_funcs.py take 2 kwargs, we need to specify them
-        # This assigns the kwargs and creates lambda func with no kwargs
-        onhover2 = lambda sel: onhover(sel, df = stardf)
-        onclick2 = lambda event: onclick(event, plot = scatter, df = stardf)
-        
-        # The connect method takes paraments like Button from Tkinter.
-        # A lambda function is taken for what to do when the cursor interacts
-        # THe 'add' parameter makes basically turns the function on.
-        cursor.connect('add', onhover2)
-        
-        cid_click = fig.canvas.mpl_connect('button_press_event', onclick2)
-        
-        self.fig = fig
-        self.ax = ax
-        self.cursor = cursor
-        
-        # Method returns self
-        return self
+        return scatter, important
     
     def highlight_constellation(self, df, color, size_mult, z):
         '''
         Method to highlight constellations in the current fig
         '''
+        self.highlights.append({'df': df, 'color': color, 'size_mult': size_mult, 'z': z})
+        self.highlight_artists.append(self.draw_highlight(self.ax, df, color, size_mult, z))
+        
+    def draw_highlight(self, ax, df, color, size_mult, z):
         x = df['X']
         y = df['Y']
         
-        self.ax.scatter(x, y, s = (df['apparent_magnitude'].abs() * 2 * size_mult),
-                        color = color,marker = 'o', picker = 5, zorder = z)
+        return ax.scatter(x, y, s = (df['apparent_magnitude'].abs() * 2 * size_mult),
+                          color = color,marker = 'o', picker = 5, zorder = z)
+    
+    def apply_projection(self, df):
+        '''
+        Recomputes the X and Y columns of a table from its alt/az columns with the map's projection
+        '''
+        X, Y = project_alt_az(df['alt'].to_numpy(), df['az'].to_numpy(), self.projection)
+        df['X'] = X.astype(np.float32)
+        df['Y'] = Y.astype(np.float32)
+        return df
+    
+    def apply_horizon(self, df):
+        '''
+        Hides the stars under the site's horizon profile, the same way stars that can't be seen get NaN coords
+        '''
+        if self.horizon is not None:
+            hidden = ~self.horizon.visible(df['alt'].to_numpy(), df['az'].to_numpy())
+            df.loc[hidden, ['X', 'Y']] = np.nan
+        return df
+    
+    def set_projection(self, projection):
+        '''
+        Switches the current chart to another projection.
+        Only the projection step runs again, and the existing scatters get the new offsets.
+        '''
+        self.projection = projection
+        self.apply_horizon(self.apply_projection(self.stardf))
+        self.scatter.set_offsets(self.stardf[['X', 'Y']].to_numpy())
+        
+        important = self.stardf.loc[self.stardf['apparent_magnitude'] <= 1]
+        self.important.set_offsets(important[['X', 'Y']].to_numpy())
+        
+        for artist, highlight in zip(self.highlight_artists, self.highlights):
+            self.apply_horizon(self.apply_projection(highlight['df']))
+            artist.set_offsets(highlight['df'][['X', 'Y']].to_numpy())
+        self.move_search_marker()
+        self.update_lines()
+    
+    def draw_lines(self, segments, visible = True):
+        '''
+        Adds the constellation stick figures to the chart as one LineCollection.
+        The segment ends are looked up in stardf once, after that only the segment arrays change.
+        '''
+        self.line_rows = segment_rows(self.stardf, segments)
+        self.lines = self.line_collection(horizon_segments(self.stardf, *self.line_rows, self.projection))
+        self.lines.set_visible(visible)
+        self.ax.add_collection(self.lines)
+    
+    def line_collection(self, segments):
+        # Same styling on screen and in exports
+        return LineCollection(segments, colors = '#a4a6ad', linewidths = 0.6, alpha = 0.7, zorder = 0.5)
+    
+    def update_lines(self):
+        if self.lines is not None and self.lines.get_visible():
+            self.lines.set_segments(horizon_segments(self.stardf, *self.line_rows, self.projection))
+    
+    def show_lines(self, visible):
+        if self.lines is not None:
+            self.lines.set_visible(visible)
+            self.update_lines()
+    
+    def find_star(self, label):
+        '''
+        Row of stardf for a star's catalog index label, or None if it isn't on the chart
+        '''
+        rows = np.flatnonzero(self.stardf['index'].to_numpy() == label)
+        return int(rows[0]) if len(rows) else None
+    
+    def mark_star(self, row, width = 1):
+        '''
+        Rings a star on the chart and centers the view on it.
+        The view keeps its zoom if it's already zoomed in further than width.
+        '''
+        self.search_row = row
+        x, y = self.stardf.loc[row, ['X', 'Y']]
+        if self.search_marker is None:
+            self.search_marker = self.ax.scatter([x], [y], s = 250, facecolors = 'none', edgecolors = 'yellow',
+                                                 linewidths = 2, zorder = 200)
+        self.move_search_marker()
+        
+        width = min(width, self.ax.get_xlim()[1] - self.ax.get_xlim()[0])
+        self.ax.set_xlim(x - width/2, x + width/2)
+        self.ax.set_ylim(y - width/2, y + width/2)
+    
+    def move_search_marker(self):
+        # Follows the searched star when its position changes (projection switch, live mode)
+        if self.search_marker is not None:
+            self.search_marker.set_offsets([self.stardf.loc[self.search_row, ['X', 'Y']].to_numpy()])
+    
+    def start_live(self):
+        '''
+        Sets up live mode, where the chart follows the current time.
+        The sin/cos terms of every plotted star's declination and the latitude are cached here,
+        so each tick only has to work out the new hour angle.
+        '''
+        now = datetime.now(timezone.utc).replace(second = 0, microsecond = 0)
+        self.live_t0 = now
+        self.live_lst0 = get_siderial_time(now, now.strftime('%H:%M'), self.lon)
+        self.live_lat = (sin(radians(self.lat)), cos(radians(self.lat)))
+        self.last_draw = 0
+        
+        # Every scatter on the chart, with the df its points came from.
+        # The bright star scatter is rebuilt from stardf on export, so its df doesn't need updating.
+        important = self.stardf.loc[self.stardf['apparent_magnitude'] <= 1]
+        layers = [(self.scatter, self.stardf, True), (self.important, important, False)]
+        layers += [(artist, h['df'], True) for artist, h in zip(self.highlight_artists, self.highlights)]
+        
+        self.live_terms = []
+        for artist, df, update_df in layers:
+            dec = df['dec_deg'].to_numpy(dtype = float)
+            raddec = np.radians(dec)
+            self.live_terms.append({'artist': artist, 'df': df if update_df else None,
+                                    'ra': df['ra_deg'].to_numpy(dtype = float),
+                                    'sin_dec': np.sin(raddec), 'cos_dec': np.cos(raddec),
+                                    'out_of_range': np.abs(dec - self.lat) > 90})
+    
+    def advance_live(self, redraw_every = 5):
+        '''
+        Moves every star to where it is right now by pushing new offsets to the existing scatters.
+        Returns True when the canvas should be redrawn, which happens at most every redraw_every seconds.
+        '''
+        now = datetime.now(timezone.utc)
+        lst = np.mod(self.live_lst0 + sidereal_rate * (now - self.live_t0).total_seconds() / 86400, 360)
+        sin_lat, cos_lat = self.live_lat
+        
+        for terms in self.live_terms:
+            ha = hour_angle_arrays(lst, terms['ra'])
+            alt, az = az_alt_calc_cached(ha, terms['sin_dec'], terms['cos_dec'], sin_lat, cos_lat, terms['out_of_range'])
+            x, y = project_alt_az(np.degrees(alt), az, self.projection)
+            if self.horizon is not None:
+                hidden = ~self.horizon.visible(np.degrees(alt), az)
+                x[hidden] = np.nan
+                y[hidden] = np.nan
+            terms['artist'].set_offsets(np.column_stack([x, y]))
+            if terms['df'] is not None:
+                terms['df']['X'] = x.astype(np.float32)
+                terms['df']['Y'] = y.astype(np.float32)
+                terms['df']['alt'] = np.degrees(alt).astype(np.float32)
+                terms['df']['az'] = az.astype(np.float32)
+        self.move_search_marker()
+        self.update_lines()
+        
+        # The title, and what a regenerate would compute, only change once a minute
+        if now.strftime('%H:%M') != self.time:
+            self.dt = datetime.now()
+            self.time = now.strftime('%H:%M')
+            self.lst = lst
+            self.title = self.chart_title()
+            self.ax.title.set_text(self.title)
+        
+        if time.monotonic() - self.last_draw >= redraw_every:
+            self.last_draw = time.monotonic()
+            return True
+        return False
         
     def find_limiting_am(self):
         '''
-        Uses Selenium to get te bortle scale of the location.
+        Gets the bortle scale of the location from the light pollution provider
+        (a local raster if there is one, otherwise Selenium).
         Converts it to limiting apparent magnitude
         '''
-        bortle_nelm = {1: 8,
-                       2: 7.5,
-                       3: 7,
-                       4: 6.5,
-                       4.5: 6.3,
-                       5: 6,
-                       6: 5.5,
-                       7: 5,
-                       8: 4.5,
-                       9: 4,}
-        
-        self.bortle = get_bortle(self.lat, self.lon)
+        self.bortle = cached_bortle(self.lat, self.lon)
         return bortle_nelm[self.bortle]
     
 class GUI(ctk.CTk):
@@ -268,9 +438,20 @@ class GUI(ctk.CTk):
         self.grid_rowconfigure((0, 1, 2, 3, 4), weight=1)
         self.config(bg=bg)
 
-        self.df = df
+        self.catalog = StarCatalog(df)
+        self.table_cache = TableCache()
+        self.name_index = NameIndex(self.catalog.names)
+        self.segments = load_segments(self.catalog)
+        self.search_matches = []
         self.stored_map = False
         
+        # The last chart is saved here on quit and brought back by restore_session
+        self.session_dir = path + '/session'
+        self.keep_session = True
+        # Horizon profiles loaded for any site are kept alongside it
+        self.horizons_path = self.session_dir + '/horizons.json'
+        load_site_profiles(self.horizons_path)
+        
         self.load_images()
         self.load_widgets()
         self.load_presets()
@@ -311,6 +492,9 @@ class GUI(ctk.CTk):
                                               variable = self.timevar, text_color="white", command = lambda: self.disable_entry(self.time_entry_box, self.timevar))
         
         self.bortle_check = tk.IntVar()
+        self.live_var = tk.IntVar(value = 0)
+        self.lines_var = tk.IntVar(value = 1)
+        self.projection_var = tk.StringVar(value = 'Orthographic')
         self.pollution_checkbox = CheckBox(self.entry_frame, text="Use projected visibility", text_color="white", variable = self.bortle_check, fg_color = bg, border_color = 'white', hover_color = lbg,)
         
         self.selected_constellation = tk.StringVar(self.map_frame, value = 'None')
@@ -330,6 +514,14 @@ class GUI(ctk.CTk):
         self.comparison_frame = CustomFrame(master = self)
         
         
+        # Star search, matches show up in the listbox under the entry as you type
+        self.search_entry = EntryBox(master = self.map_frame, placeholder_text = 'Find a star', font = font)
+        self.search_results = tk.Listbox(self.map_frame, bg = bg, fg = 'white', font = font, selectbackground = lfg,
+                                         highlightthickness = 0, borderwidth = 0, activestyle = 'none')
+        self.search_entry.bind('<KeyRelease>', self.update_search)
+        self.search_entry.bind('<Return>', self.select_search)
+        self.search_results.bind('<<ListboxSelect>>', self.select_search)
+        
         self.no_canvaslbl = H2Label(master = self.map_frame,
                                     text = 'To view a chart, enter a valid location, date, and time.', text_color=mfg, font=("Arial Rounded MT Bold", 20))
             
@@ -357,7 +549,7 @@ class GUI(ctk.CTk):
         self.info_ctk_img = ctk.CTkImage(light_image = info_img, size = (40,40))
     
     def load_presets(self):
-        dictionary = {"Atacama Desert, Chile":["-24.5","-69.25"],
+        self.presets = {"Atacama Desert, Chile":["-24.5","-69.25"],
               "Natural Bridges, Utah":["37.601383","-110.013744"],
               "Iriomote-Ishigaki National Park, Japan":["24.316667","123.883333"],
               "Kruger National Park, South Africa": ["-24.011389","31.485278"],
@@ -377,7 +569,7 @@ class GUI(ctk.CTk):
                 
             self.selected_preset.set('Presets')
             
-        self.preset_dropdown = ctk.CTkOptionMenu(self.entry_frame, variable = self.selected_preset, values = list(dictionary.keys()),
+        self.preset_dropdown = ctk.CTkOptionMenu(self.entry_frame, variable = self.selected_preset, values = list(self.presets.keys()),
                                      fg_color = bg, button_color = bg, font = ("Arial Rounded MT Bold", 20), text_color = 'white', button_hover_color=lbg,
                                      dropdown_fg_color = bg, dropdown_font = font, dropdown_hover_color=lbg, dropdown_text_color='white',
                                      command = preset_callback)
@@ -453,10 +645,17 @@ class GUI(ctk.CTk):
         
         text_total = "\n\n".join([text1, text2,text3,text4,text5,text6,text7,text8])
         
+        box = self.info_box('Help', text_total, width)
+        return box.get()
+    
+    def info_box(self, title, message, width):
+        '''
+        Plain message box with no icon, used for the help and site ranking popups
+        '''
         box = CTkMessagebox.CTkMessagebox(
             master = self,
-            title='Help',
-            message=text_total,
+            title=title,
+            message=message,
             width = width,
             icon=None,
             bg_color=bg,    
@@ -471,11 +670,78 @@ class GUI(ctk.CTk):
             height = width / 12,
             border_width= 0
         )
+        return box
+    
+    def rank_sites(self):
+        '''
+        Ranks every preset plus the current location for the current chart's date and time.
+        All sites are computed together in one sites x stars calculation.
+        '''
+        sites = {name: coords for name, coords in self.presets.items()}
+        sites[self.map.address] = (self.map.lat, self.map.lon)
+        
+        # Only Bortle classes that were already looked up are used, scraping every site would freeze the window.
+        # Sites without one use the current limiting magnitude and are marked in the list
+        unknown = set()
+        if self.bortle_check.get() == 1:
+            limits = []
+            for name, (lat, lon) in sites.items():
+                bortle = known_bortle(lat, lon)
+                if bortle is None:
+                    unknown.add(name)
+                    limits.append(self.limiting_am.get())
+                else:
+                    limits.append(bortle_nelm[bortle])
+        else:
+            limits = self.limiting_am.get()
+        
+        selected = self.selected_constellation.get()
+        constellation = None
+        if selected != 'Select A Constellation' and selected != 'None':
+            constellation = selected.split(':')[0].strip()
+        
+        ranking = rank_sites(self.catalog, sites, self.map.dt, limiting_am = limits,
+                             constellation = constellation)
+        
+        if constellation is None:
+            lines = [f'{i}. {name}: {count} stars' for i, (name, count, _) in enumerate(ranking, 1)]
+        else:
+            lines = [f'{i}. {name}: {c_count} {constellation} stars ({count} total)'
+                     for i, (name, count, c_count) in enumerate(ranking, 1)]
+        lines = [line + (' *' if name in unknown else '') for line, (name, _, _) in zip(lines, ranking)]
+        
+        title = f"Best Sites at {self.map.time} UTC on {self.map.dt.strftime('%B %d, %Y')}"
+        if unknown:
+            title += f'\n* No Bortle data looked up yet, uses a limiting magnitude of {self.limiting_am.get()}'
+        box = self.info_box('Site Ranking', title + '\n\n' + '\n'.join(lines), 600)
+        return box.get()
+    
+    def plan_night(self):
+        '''
+        Finds the best times over the next 30 days to see the selected constellation from the current location
+        '''
+        selected = self.selected_constellation.get()
+        if selected == 'Select A Constellation' or selected == 'None':
+            self.info_box('Night Planner', 'Select a constellation to plan for first.', 400)
+            return
+        
+        constellation = selected.split(':')[0].strip()
+        members = constellation_members(self.catalog, constellation, self.limiting_am.get())
+        windows = plan_windows(self.catalog, self.map.lat, self.map.lon, self.map.dt.astimezone(), members, days = 30)
+        
+        if not windows:
+            message = f'{constellation} is never above the horizon at night from here in the next 30 days.'
+        else:
+            lines = [f"{i}. {w['best'].strftime('%B %d')}, {w['start'].strftime('%I:%M%p')} to {w['end'].strftime('%I:%M%p')}: "
+                     f"{w['visible']} of {len(members)} stars up, best at {w['best'].strftime('%I:%M%p')} ({w['altitude']:.0f}° average altitude)"
+                     for i, w in enumerate(windows, 1)]
+            message = f'Best nights for {constellation} from {self.map.address}\n\n' + '\n'.join(lines)
+        box = self.info_box('Night Planner', message, 600)
         return box.get()
     
     def quit_button(self):
         '''
-        Turns out that mplcursors and mpl event handling uses event loops,
+        Turns out that mpl event handling uses event loops,
         which makes sense. plt.close('all') is necessary to close those
         If you do not include this, the terminal will not close -> inf loop
         
@@ -483,6 +749,12 @@ class GUI(ctk.CTk):
         https://stackoverflow.com/questions/26168967/invalid-command-name-while-executing-after-script
         This fixes it.
         '''
+        if hasattr(self, 'live_job'):
+            self.after_cancel(self.live_job)
+        if hasattr(self, 'session_job'):
+            self.after_cancel(self.session_job)
+        self.cancel_build()
+        self.save_session()
         plt.close('all')
         if hasattr(self, 'toolbar'):
             self.toolbar.destroy()
@@ -490,6 +762,124 @@ class GUI(ctk.CTk):
         self.quit()
         self.destroy()
     
+    def save_session(self):
+        '''
+        Saves the inputs, the current and stored charts' coords, Bortle class, and star positions
+        so the next launch can show them straight away
+        '''
+        if not self.keep_session or not hasattr(self, 'map') or not hasattr(self.map, 'stardf'):
+            return
+        
+        arrays = {}
+        state = {'version': snapshot_version, 'catalog': catalog_fingerprint(self.catalog),
+                 'inputs': {'address': self.address_entry.get(), 'date': self.date_entry_box.get(), 'time': self.time_entry_box.get(),
+                            'use_current_date': self.datevar.get(), 'use_current_time': self.timevar.get(),
+                            'projected': self.bortle_check.get(), 'limiting_am': self.limiting_am.get(),
+                            'constellation': self.selected_constellation.get(), 'projection': self.projection_var.get(),
+                            'lines': self.lines_var.get(), 'live': self.live_var.get()},
+                 'current': map_state(self.map, self.catalog, 'current', arrays),
+                 'stored': map_state(self.stored_map, self.catalog, 'stored', arrays) if self.stored_map else None}
+        try:
+            save_snapshot(self.session_dir, state, arrays)
+        except OSError as error:
+            print(f"Couldn't save the session: {error}")
+    
+    def snapshot_map(self, state):
+        dt = datetime.strptime(f"{state['date']} {state['time']}", '%m/%d/%Y %I:%M%p')
+        map = LocStarMap(state['address'], dt, coords = (state['lat'], state['lon']))
+        if state['bortle'] is not None:
+            map.bortle = state['bortle']
+        return map
+    
+    def restore_session(self):
+        '''
+        Shows the last session's chart straight from its snapshot, with no geocoding, Bortle lookup, or
+        position calculations. The address and Bortle class are then checked again in the background.
+        '''
+        snapshot = load_snapshot(self.session_dir, self.catalog)
+        if snapshot is None:
+            return
+        state, arrays = snapshot
+        inputs = state['inputs']
+        
+        for entry, text in ((self.address_entry, inputs['address']), (self.date_entry_box, inputs['date']), (self.time_entry_box, inputs['time'])):
+            entry.configure(state = 'normal')
+            entry.delete(0, tk.END)
+            entry.insert(0, text)
+        self.datevar.set(inputs['use_current_date'])
+        self.timevar.set(inputs['use_current_time'])
+        self.disable_entry(self.date_entry_box, self.datevar)
+        self.disable_entry(self.time_entry_box, self.timevar)
+        self.bortle_check.set(inputs['projected'])
+        self.limiting_am.set(inputs['limiting_am'])
+        self.selected_constellation.set(inputs['constellation'])
+        self.projection_var.set(inputs['projection'])
+        self.lines_var.set(inputs['lines'])
+        self.live_var.set(inputs['live'])
+        
+        # The stored chart is drawn now, finish_canvas puts it in the comparison frame
+        stored_table = snapshot_table(self.catalog, arrays, 'stored')
+        if state['stored'] is not None and stored_table is not None:
+            stored = self.snapshot_map(state['stored'])
+            stored.projection = state['stored']['projection']
+            stored_table = stored_table.reset_index()
+            stored.plot_stars(stored_table)
+            if state['stored']['highlight'] is not None:
+                stored.highlight_constellation(self.filter_by_constellation(stored_table, state['stored']['highlight']),
+                                               color = 'red', size_mult = 2, z = 100)
+            stored.draw_lines(self.segments, visible = self.lines_var.get() == 1)
+            self.stored_map = stored
+        
+        # The saved positions go in the table cache, so update_canvas charts them without recomputing.
+        # Cached tables are Orthographic with no horizon mask, and the saved X/Y were in the chart's
+        # projection and masked, so they're worked out again from the saved alt/az first
+        self.map = self.snapshot_map(state['current'])
+        table = snapshot_table(self.catalog, arrays, 'current')
+        if table is not None:
+            X, Y = project_alt_az(table['alt'].to_numpy(), table['az'].to_numpy(), 'Orthographic')
+            table['X'] = X.astype(np.float32)
+            table['Y'] = Y.astype(np.float32)
+            self.table_cache.put(self.table_cache.key(self.map, inputs['limiting_am']), table)
+        self.update_canvas()
+        
+        validator = SessionValidator(self.map.address, self.map.lat, self.map.lon, geocode_address,
+                                     bortle_lookup = cached_bortle if inputs['projected'] else None)
+        validator.start()
+        self.poll_session(validator, self.map)
+    
+    def poll_session(self, validator, restored):
+        '''
+        Waits on the background check of a restored chart, and regenerates the chart
+        if the location or Bortle class changed, or if it was made with the current date/time.
+        '''
+        if validator.result.empty():
+            self.session_job = self.after(200, lambda: self.poll_session(validator, restored))
+            return
+        if hasattr(self, 'session_job'):
+            del self.session_job
+        
+        lat, lon, bortle = validator.result.get()
+        # Anything the user has generated since wins
+        if self.map is not restored:
+            return
+        
+        moved = abs(lat - restored.lat) > 1e-4 or abs(lon - restored.lon) > 1e-4
+        relit = bortle is not None and bortle != getattr(restored, 'bortle', None)
+        stale = self.datevar.get() == 1 or self.timevar.get() == 1
+        if not (moved or relit or stale):
+            return
+        
+        now = datetime.now().replace(second = 0, microsecond = 0)
+        dt = datetime.combine(now.date() if self.datevar.get() == 1 else restored.dt.date(),
+                              now.time() if self.timevar.get() == 1 else restored.dt.time())
+        map = LocStarMap(restored.address, dt, coords = (lat, lon))
+        if bortle is not None:
+            map.bortle = bortle
+        elif hasattr(restored, 'bortle') and not moved:
+            map.bortle = restored.bortle
+        self.map = map
+        self.update_canvas()
+    
     def disable_entry(self, entry, var):
         if var.get() == 1:
             entry.configure(state = 'disabled')
@@ -503,12 +893,12 @@ class GUI(ctk.CTk):
     def clear_button(self):
         self.map_frame.place_forget()
     
-    def filter_by_constellation(self, constellation):
-        filtered_df = self.df.loc[self.df['parent_constellation'] == constellation]
+    def filter_by_constellation(self, df, constellation):
+        filtered_df = df.loc[df['parent_constellation'] == constellation].copy()
         return filtered_df
     
     def constellation_dropdown(self, frame, df):
-        visible_df = df.loc[df['X'] != 100]
+        visible_df = df.loc[df['X'].notna()]
         constellation_value_counts = visible_df['parent_constellation'].value_counts()
         limited_constellation_value_counts = constellation_value_counts.loc[constellation_value_counts > 5]
         constellations = list(limited_constellation_value_counts.index)
@@ -519,13 +909,13 @@ class GUI(ctk.CTk):
                                      dropdown_font=("Arial Rounded MT Bold", 15), dropdown_fg_color=bg, dropdown_hover_color=lbg, dropdown_text_color="white",command = self.update_dropdown)
         return dropdown
     
-    def pick_dropdown(self):
+    def pick_dropdown(self, df):
         const = self.selected_constellation.get()
         if const == 'Select A Constellation':
-            return self.df
+            return df
 
         else:
-            filtered_df = self.filter_by_constellation(const.split(':')[0].strip())
+            filtered_df = self.filter_by_constellation(df, const.split(':')[0].strip())
             return filtered_df
     
     def open_settings(self):
@@ -581,12 +971,27 @@ class GUI(ctk.CTk):
 
         add_tooltip(self.store_button, f"{self.stored_map.address} ({self.stored_map.time} UTC)")
         stored_canvas = FigureCanvasTkAgg(self.stored_map.fig, master = self.comparison_frame)
-        stored_canvas.draw()
+        self.draw_canvas(stored_canvas)
         stored_canvas_widget = stored_canvas.get_tk_widget()
         stored_canvas_widget.configure(bg = fg)
         self.stored_canvas_widget = stored_canvas_widget
         self.stored_canvas_widget.place(anchor = 'center', relx = .49, rely = .535, relwidth = 1, relheight = 0.85)
         
+    def draw_canvas(self, canvas, retry = 50):
+        '''
+        Draws a chart canvas without waiting on an export or server render that has render_lock.
+        If one does, the draw is tried again every retry ms, so the window never freezes.
+        '''
+        if not render_lock.acquire(blocking = False):
+            self.after(retry, lambda: self.draw_canvas(canvas, retry))
+            return
+        try:
+            # The chart may have been replaced while this draw was waiting
+            if canvas.get_tk_widget().winfo_exists():
+                canvas.draw()
+        finally:
+            render_lock.release()
+        
     def show_comparison(self):
         self.comparison_frame.place(relx = 0.5075, rely = 0.0267, relwidth=0.4775, relheight=0.9467)
         self.hide_compare_button.place(relx = .747, rely = 0.02)
@@ -599,6 +1004,10 @@ class GUI(ctk.CTk):
         '''
         Method used to update the existing canvas in the map frame.
         '''
+        # Live updates would go to the new map before its chart exists
+        self.stop_live()
+        # A chart still waiting to be built from an earlier press is replaced by this one
+        self.cancel_build()
         if hasattr(self, 'fig'):
             self.clear_button()
             self.map_frame.place(relx=0.015, rely=0.0267, relwidth=0.4775, relheight=0.9467)
@@ -607,18 +1016,64 @@ class GUI(ctk.CTk):
             if not hasattr(self.map, 'bortle'):
                 self.limiting_am.set(self.map.find_limiting_am())
             else:
-                self.limiting_am.set(self.map.bortle)
+                self.limiting_am.set(bortle_nelm[self.map.bortle])
         
         # Constructing the table and reseting the index because we want the indexes to match with our star names
-        limited_df = self.map.construct_table(self.df, am = self.limiting_am.get()).reset_index()
+        # Going back to inputs we already charted comes from the cache instead of being recomputed
+        limited_df = self.table_cache.get_table(self.map, self.catalog, self.limiting_am.get()).reset_index()
+        
+        # Cached tables are in the default projection, other projections only redo the x,y step
+        self.map.projection = self.projection_var.get()
+        if self.map.projection != 'Orthographic':
+            self.map.apply_projection(limited_df)
+        self.map.apply_horizon(limited_df)
         #limited_df.to_csv(r'C:\Users\ricky\OneDrive\Documents\HARP151\Final Project\HARP-151-Final-Project\test.csv')
         
-        self.map.plot_stars(limited_df)
         selected = self.selected_constellation.get()
-        
+        highlighted = None
         if selected != 'Select A Constellation' and selected != 'None':
-            highlighted = self.map.construct_table(self.pick_dropdown(), am = self.limiting_am.get()).reset_index()
+            # Same stars and magnitude limit as the full table, so the highlight is just a filter of it
+            highlighted = self.pick_dropdown(limited_df)
+        
+        # Charts with lots of stars get a quick raster preview first.
+        # The interactive chart is then built once Tk has painted the preview, and replaces it
+        visible_df = limited_df.loc[limited_df['X'].notna()]
+        if len(visible_df) >= preview_min_stars:
+            self.show_preview(visible_df, highlighted)
+            self.update_idletasks()
+            map = self.map
+            self.build_job = self.after(1, lambda: self.finish_canvas(limited_df, highlighted, map))
+        else:
+            self.finish_canvas(limited_df, highlighted, self.map)
+    
+    def cancel_build(self):
+        if hasattr(self, 'build_job'):
+            self.after_cancel(self.build_job)
+            del self.build_job
+    
+    def show_preview(self, stardf, highlighted):
+        highlights = [] if highlighted is None else [{'df': highlighted, 'color': 'red', 'size_mult': 2}]
+        image = preview_image(stardf, size = 500, highlights = highlights)
+        self.preview_ctk_img = ctk.CTkImage(light_image = image, size = image.size)
+        
+        if not hasattr(self, 'preview_label'):
+            self.preview_label = ctk.CTkLabel(self.map_frame, text = '', fg_color = fg)
+        self.preview_label.configure(image = self.preview_ctk_img)
+        self.preview_label.place(anchor = 'center', relx = .49, rely = .535)
+        self.preview_label.lift()
+    
+    def finish_canvas(self, limited_df, highlighted, map):
+        '''
+        Builds the interactive matplotlib chart for map (the map limited_df was computed for)
+        and puts it in the map frame
+        '''
+        if hasattr(self, 'build_job'):
+            del self.build_job
+        self.map = map
+        self.map.plot_stars(limited_df)
+        if highlighted is not None:
             self.map.highlight_constellation(highlighted, color = 'red', size_mult = 2, z=100)
+        self.map.draw_lines(self.segments, visible = self.lines_var.get() == 1)
                 
         # Avoiding stacking dropdowns.
         if hasattr(self, 'dropdown'):
@@ -629,7 +1084,7 @@ class GUI(ctk.CTk):
         self.cursor = self.map.cursor
     
         canvas = FigureCanvasTkAgg(self.map.fig, master=self.map_frame)
-        canvas.draw()
+        self.draw_canvas(canvas)
         
         # Figured out how to add figures into Tkinter here:
         # https://pythonprogramming.net/how-to-embed-matplotlib-graph-tkinter-gui/
@@ -643,9 +1098,43 @@ class GUI(ctk.CTk):
         self.create_settings_widgets(limited_df)
         if self.stored_map:
             self.show_compare_button.configure(state = 'normal')
+            # A stored chart restored from the last session doesn't have its canvas yet
+            if not hasattr(self, 'stored_canvas_widget'):
+                self.store_map(current = False)
             
         self.dropdown.place(relx=0.5, rely=0.676, anchor="center", relwidth=0.5, relheight=0.05)
         self.canvas_widget.place(anchor = 'center', relx = .49, rely = .535, relwidth = 1, relheight = 0.85)
+        self.search_entry.place(relx = .05, rely = .043, relwidth = .45, anchor = 'w')
+        self.search_results.place_forget()
+        if hasattr(self, 'preview_label'):
+            self.preview_label.place_forget()
+        self.toggle_live()
+    
+    def live_allowed(self):
+        return self.datevar.get() == 1 and self.timevar.get() == 1
+    
+    def toggle_live(self):
+        '''
+        Starts or stops live mode. Live mode only works for charts made with the current date and time.
+        '''
+        self.stop_live()
+        if self.live_var.get() == 1 and self.live_allowed():
+            self.map.start_live()
+            self.live_tick()
+        
+    def stop_live(self):
+        if hasattr(self, 'live_job'):
+            self.after_cancel(self.live_job)
+            del self.live_job
+    
+    def live_tick(self, interval = 1000):
+        '''
+        Runs every second while live mode is on. Only the star offsets are updated,
+        and the canvas is redrawn with draw_idle when advance_live says it's time.
+        '''
+        if self.map.advance_live():
+            self.canvas.draw_idle()
+        self.live_job = self.after(interval, self.live_tick)
     
     def create_toolbar(self):
         '''
@@ -675,8 +1164,9 @@ class GUI(ctk.CTk):
         tooldict['Zoom'].configure(text = 'Zoom Mode', font=("Arial Rounded MT Bold", 20))
         #tooldict['Save'].configure(text = 'Save')
         
+        # Downloads go through our own export popup instead of the toolbar's save dialog
         savebutton['Save'].configure(text = 'Download Star Chart', font=("Arial Rounded MT Bold", 25),
-                                     fg_color = bg, bg_color = fg, hover_color = lbg)
+                                     fg_color = bg, bg_color = fg, hover_color = lbg, command = self.open_export)
         
         tooldict['Home'].place(relx=0.733, rely = 0.25, relheight = 0.5, relwidth = 0.2)
         tooldict['Back'].place(relx=0.395, rely = yvalue + 0.025)
@@ -691,6 +1181,139 @@ class GUI(ctk.CTk):
         self.save_button.place(relx = xvalue, rely = 0.951, relwidth = 0.866, anchor = 'sw')
         self.save_button.configure(bg = fg)
         
+    def open_export(self):
+        '''
+        Popup for downloading the current chart (and optionally the stored one)
+        at a chosen format, dpi, and size. Rendering happens in a background thread.
+        '''
+        export_root = ctk.CTkToplevel(self)
+        export_root.title('Download Star Chart')
+        export_root.configure(fg_color = fg)
+        H2Label(master = export_root, text = 'Download Star Chart').pack(padx = 20, pady = 10)
+        
+        fmt = tk.StringVar(export_root, value = export_formats[0])
+        dpi = tk.StringVar(export_root, value = '300')
+        size = tk.StringVar(export_root, value = '8')
+        for label, var, values in [('Format', fmt, export_formats), ('DPI', dpi, export_dpis), ('Size (inches)', size, export_sizes)]:
+            H3Label(master = export_root, text = label).pack()
+            ctk.CTkOptionMenu(export_root, variable = var, values = values, fg_color = bg, button_color = bg, font = font,
+                              text_color = 'white', button_hover_color = lbg, dropdown_fg_color = fg, dropdown_font = font).pack(pady = 5)
+        
+        include_stored = tk.IntVar(value = 0)
+        stored_checkbox = CheckBox(export_root, text = "Include stored chart", variable = include_stored, fg_color = bg,
+                                   border_color = 'white', hover_color = lbg, text_color = "white",
+                                   state = 'normal' if self.stored_map else 'disabled')
+        stored_checkbox.pack(pady = 5)
+        
+        progress = ctk.CTkProgressBar(export_root, progress_color = mfg, fg_color = bg)
+        progress.set(0)
+        status = H3Label(master = export_root, text = '')
+        
+        def start():
+            folder = filedialog.askdirectory(parent = export_root)
+            if not folder:
+                return
+            
+            # Everything the export draws is copied here, since the maps and axes belong to the Tk thread
+            snapshots = [chart_snapshot(self.map, (self.map.ax.get_xlim(), self.map.ax.get_ylim()))]
+            if include_stored.get() == 1 and self.stored_map:
+                snapshots.append(chart_snapshot(self.stored_map, (self.stored_map.ax.get_xlim(), self.stored_map.ax.get_ylim()),
+                                                 kind = 'stored'))
+            
+            exporter = ChartExporter(snapshots, folder, fmt = fmt.get(), size = int(size.get()), dpi = int(dpi.get()))
+            export_button.configure(state = 'disabled')
+            progress.set(0)
+            exporter.start()
+            self.poll_export(exporter, export_root, progress, status, export_button)
+        
+        export_button = ctk.CTkButton(export_root, text = 'Export', command = start, fg_color = bg, hover_color = lbg, font = font)
+        export_button.pack(pady = 5)
+        progress.pack(padx = 20, pady = 5)
+        status.pack(padx = 20, pady = 10)
+    
+    def poll_export(self, exporter, export_root, progress, status, export_button):
+        '''
+        Checks on the export thread every 100ms and updates the progress bar.
+        '''
+        if not export_root.winfo_exists():
+            return
+        
+        finished = False
+        while not exporter.progress.empty():
+            fraction, message = exporter.progress.get()
+            progress.set(fraction)
+            if message is None:
+                finished = True
+            else:
+                status.configure(text = message)
+        
+        if finished:
+            saved = len(exporter.saved)
+            status.configure(text = f"Saved {saved} chart{'s' if saved != 1 else ''}"
+                             + (f", {len(exporter.errors)} failed" if exporter.errors else ''))
+            export_button.configure(state = 'normal')
+        else:
+            self.after(100, lambda: self.poll_export(exporter, export_root, progress, status, export_button))
+        
+    def update_search(self, event):
+        '''
+        Lists the stars matching what's in the search box
+        '''
+        if event.keysym == 'Return':
+            return
+        self.search_matches = self.name_index.search(self.search_entry.get(), limit = 8)
+        self.search_results.delete(0, 'end')
+        for name, _ in self.search_matches:
+            self.search_results.insert('end', name)
+        
+        if self.search_matches:
+            self.search_results.configure(height = len(self.search_matches))
+            self.search_results.place(relx = .05, rely = .07, relwidth = .45)
+            self.search_results.lift()
+        else:
+            self.search_results.place_forget()
+    
+    def select_search(self, event = None):
+        # Clicking a match picks it, Enter in the search box picks the first one
+        if not self.search_matches:
+            return
+        selection = self.search_results.curselection()
+        name, position = self.search_matches[selection[0] if selection else 0]
+        
+        self.search_results.place_forget()
+        self.search_entry.delete(0, 'end')
+        self.search_entry.insert(0, name)
+        self.locate_star(name, position)
+    
+    def locate_star(self, name, position):
+        '''
+        Centers the chart on a star and rings it, using the position already worked out for the chart.
+        Stars that aren't drawn get a message saying why.
+        '''
+        row = self.map.find_star(self.catalog.index[position])
+        if row is None:
+            # Not on the chart, so its altitude is only worked out for the message
+            ha = hour_angle_arrays(self.map.lst, self.catalog.ra[position:position + 1])
+            alt, _ = az_alt_calc_arrays(self.catalog.dec[position:position + 1], ha, self.map.lat)
+            alt = np.degrees(alt[0])
+        else:
+            alt = self.map.stardf.loc[row, 'alt']
+        
+        if alt < 0:
+            self.info_box('Star Search', f'{name} is below the horizon ({alt:.1f}° altitude) at this time and place.', 400)
+        elif row is not None and np.isnan(self.map.stardf.loc[row, 'X']):
+            self.info_box('Star Search', f'{name} is hidden behind the local horizon ({alt:.1f}° altitude) at this time and place.', 400)
+        elif row is None and self.catalog.mag[position] >= self.limiting_am.get():
+            self.info_box('Star Search', f'{name} (magnitude {self.catalog.mag[position]:.2f}) is too faint for the current '
+                          f'limiting magnitude of {self.limiting_am.get()}.', 400)
+        elif row is None:
+            self.info_box('Star Search', f"{name} isn't on this chart.", 400)
+        else:
+            # Pushing the current view first lets the toolbar's back button undo the jump
+            self.toolbar.push_current()
+            self.map.mark_star(row)
+            self.canvas.draw_idle()
+    
     def update_spinbox(self, count):
         self.limiting_am.set(count)
         self.bortle_check.set(0)
@@ -698,6 +1321,40 @@ class GUI(ctk.CTk):
     
     def update_dropdown(self, value):
         self.update_canvas()
+    
+    def load_horizon(self):
+        '''
+        Loads a horizon profile csv for the current site, or clears the one it has
+        '''
+        if self.map.horizon is None:
+            path = filedialog.askopenfilename(parent = self, title = 'Horizon profile (azimuth, altitude)',
+                                              filetypes = [('CSV files', '*.csv'), ('All files', '*.*')])
+            if not path:
+                return
+            try:
+                profile = load_profile(path)
+            except (OSError, ValueError, pd.errors.ParserError) as error:
+                self.show_space_error(message = f"Couldn't load the horizon profile: {error}")
+                return
+        else:
+            profile = None
+        
+        set_site_profile(self.map.lat, self.map.lon, profile)
+        self.map.horizon = profile
+        if self.keep_session:
+            try:
+                save_site_profiles(self.horizons_path)
+            except OSError as error:
+                print(f"Couldn't save the horizon profiles: {error}")
+        self.update_canvas()
+    
+    def toggle_lines(self):
+        self.map.show_lines(self.lines_var.get() == 1)
+        self.canvas.draw_idle()
+    
+    def update_projection(self, value):
+        self.map.set_projection(value)
+        self.canvas.draw_idle()
         
     def create_settings_widgets(self, df):
         '''
@@ -722,10 +1379,26 @@ class GUI(ctk.CTk):
         self.comparison_label = ctk.CTkLabel(self.settings_frame, text="Comparison", text_color="white", font=("Arial Rounded MT Bold", 25))
         self.comparison_info = ctk.CTkLabel(self.settings_frame, text="Use to store your current chart so you can view it side by side with any\nnew chart you generate.", text_color="white", font=("Arial Rounded MT Bold", 15, "italic"), justify="left")
         self.constellation_label = ctk.CTkLabel(self.settings_frame, text="Constellations", text_color="white", font=("Arial Rounded MT Bold", 25))
+        self.projection_dropdown = ctk.CTkOptionMenu(self.settings_frame, variable = self.projection_var, values = list(projections.keys()),
+                                                     fg_color = bg, button_color = bg, font = ("Arial Rounded MT Bold", 15), button_hover_color = lbg,
+                                                     text_color = "white", dropdown_font = font, dropdown_fg_color = bg, dropdown_hover_color = lbg,
+                                                     dropdown_text_color = "white", command = self.update_projection)
+        self.live_checkbox = CheckBox(self.settings_frame, text="Live sky", text_color="white", variable = self.live_var, fg_color = bg,
+                                      border_color = 'white', hover_color = lbg, command = self.toggle_live,
+                                      state = 'normal' if self.live_allowed() else 'disabled')
+        self.lines_checkbox = CheckBox(self.settings_frame, text="Constellation lines", text_color="white", variable = self.lines_var, fg_color = bg,
+                                       border_color = 'white', hover_color = lbg, command = self.toggle_lines)
         self.constellation_info = ctk.CTkLabel(self.settings_frame, text="Select a constellation to highlight.", text_color="white", font=("Arial Rounded MT Bold", 15, "italic"), justify="left")
         self.hide_compare_button = ctk.CTkButton(self.comparison_frame, text = 'Hide', fg_color = bg, bg_color = fg, font=("Arial Rounded MT Bold", 25), text_color="white", hover_color=lbg, command = self.hide_comparison)
         self.store_button = ctk.CTkButton(self.settings_frame, text = 'Store Chart', fg_color = bg, bg_color = fg, font=("Arial Rounded MT Bold", 25),
                                           command = self.store_map, hover_color=lbg, text_color="white")
+        self.rank_button = ctk.CTkButton(self.settings_frame, text = 'Rank Sites', fg_color = bg, bg_color = fg, font=("Arial Rounded MT Bold", 20),
+                                         command = self.rank_sites, hover_color=lbg, text_color="white")
+        self.horizon_button = ctk.CTkButton(self.settings_frame, text = 'Load Horizon' if self.map.horizon is None else 'Clear Horizon',
+                                            fg_color = bg, bg_color = fg, font=("Arial Rounded MT Bold", 20),
+                                            command = self.load_horizon, hover_color=lbg, text_color="white")
+        self.plan_button = ctk.CTkButton(self.settings_frame, text = 'Plan Night', fg_color = bg, bg_color = fg, font=("Arial Rounded MT Bold", 20),
+                                         command = self.plan_night, hover_color=lbg, text_color="white")
         self.show_compare_button = ctk.CTkButton(self.settings_frame, text = 'View Stored Chart', font=("Arial Rounded MT Bold", 25), fg_color = bg, bg_color = fg,
                                                  command = self.show_comparison, state = 'disabled', text_color_disabled="#a4a6ad", text_color="white", hover_color=lbg
                                                  )
@@ -739,11 +1412,17 @@ class GUI(ctk.CTk):
         
         self.constellation_label.place(relx=xvalue, rely=0.56)
         self.constellation_info.place(relx=xvalue, rely=0.6)
+        self.plan_button.place(relx=xvalue+0.638, rely=0.56, relwidth=0.233)
         
+        self.lines_checkbox.place(relx=xvalue+0.638, rely=yvalue+0.045)
+        self.live_checkbox.place(relx=xvalue+0.638, rely=yvalue+0.09)
+        self.projection_dropdown.place(relx=xvalue+0.638, rely=yvalue+0.315, relwidth=0.233)
         self.comparison_label.place(relx=xvalue, rely=yvalue+0.66)
+        self.rank_button.place(relx=xvalue+0.638, rely=yvalue+0.655, relwidth=0.233)
         self.comparison_info.place(relx=xvalue, rely=yvalue+0.705)
         
         self.am_spinbox.place(relx=0.5,rely=yvalue + 0.475, anchor = "center", relwidth=0.25, relheight=0.075)
+        self.horizon_button.place(relx=xvalue+0.638, rely=yvalue + 0.475, anchor = "w", relwidth=0.233)
         self.store_button.place(relx=xvalue, rely=0.82, relwidth=0.428)
         self.show_compare_button.place(relx=xvalue+0.438, rely=0.82, relwidth=0.433)
         
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from functions import projections
+
+lines_path = os.path.dirname(os.path.realpath(__file__)) + '/datasets/constellation_lines.csv'
+
+def load_segments(catalog, path = lines_path):
+    '''
+    Reads the stick figure table (parent_constellation, star_a, star_b, using the catalog's star names)
+    and resolves both ends of every segment to catalog index labels once.
+    Names are looked up across the whole catalog, since some figures borrow a star from
+    a neighbouring constellation (Pegasus' square uses Alpheratz, which is in Andromeda).
+    Names that show up more than once go to the brightest star.
+    Segments whose stars aren't in the catalog are dropped.
+    '''
+    if not os.path.exists(path):
+        return {'a': np.array([], dtype = np.int64), 'b': np.array([], dtype = np.int64), 'constellation': np.array([], dtype = object)}
+    table = pd.read_csv(path)
+    wanted = set(table['star_a']) | set(table['star_b'])
+
+    brightest = {}
+    for i in range(len(catalog)):
+        name = catalog.names[i]
+        if name in wanted:
+            if name not in brightest or catalog.mag[i] < catalog.mag[brightest[name]]:
+                brightest[name] = i
+
+    a, b, constellations = [], [], []
+    for row in table.itertuples(index = False):
+        ends = brightest.get(row.star_a), brightest.get(row.star_b)
+        if None not in ends:
+            a.append(catalog.index[ends[0]])
+            b.append(catalog.index[ends[1]])
+            constellations.append(row.parent_constellation)
+    return {'a': np.array(a), 'b': np.array(b), 'constellation': np.array(constellations, dtype = object)}
+
+def segment_rows(stardf, segments):
+    '''
+    Rows of stardf for both ends of every segment. Segments with an end that isn't on the chart
+    (too faint for the limiting magnitude) are left out.
+    '''
+    index = pd.Index(stardf['index'])
+    a = index.get_indexer(segments['a'])
+    b = index.get_indexer(segments['b'])
+    keep = (a >= 0) & (b >= 0)
+    return a[keep], b[keep]
+
+def horizon_segments(stardf, a, b, projection = 'Orthographic'):
+    '''
+    (n, 2, 2) array of segment end points from the chart's positions.
+    Segments entirely below the horizon are dropped, and segments that cross it
+    are cut where they meet it, found by interpolating the altitude along the segment.
+    '''
+    alt = stardf['alt'].to_numpy(dtype = float)
+    az = stardf['az'].to_numpy(dtype = float)
+    xy = stardf[['X', 'Y']].to_numpy(dtype = float)
+
+    alt_a, alt_b = alt[a], alt[b]
+    keep = (alt_a >= 0) | (alt_b >= 0)
+    a, b, alt_a, alt_b = a[keep], b[keep], alt_a[keep], alt_b[keep]
+    start, end = xy[a], xy[b]
+
+    crossing = (alt_a < 0) | (alt_b < 0)
+    if crossing.any():
+        t = alt_a[crossing] / (alt_a[crossing] - alt_b[crossing])
+        # Shortest way around in azimuth, so segments across north don't swing the long way
+        daz = np.mod(az[b[crossing]] - az[a[crossing]] + 180, 360) - 180
+        radaz = np.radians(az[a[crossing]] + t*daz)
+        r = projections[projection](np.pi/2)
+        horizon = np.column_stack([r*np.sin(radaz), r*np.cos(radaz)])
+
+        below_a = alt_a[crossing] < 0
+        rows = np.flatnonzero(crossing)
+        start[rows[below_a]] = horizon[below_a]
+        end[rows[~below_a]] = horizon[~below_a]
+
+    return np.stack([start, end], axis = 1)
@@ -1,23 +1,13 @@
-import requests
-import json
-from datetime import datetime
+from datetime import datetime, timezone
 from astropy.time import Time
 from math import cos, sin, radians, degrees, asin, acos, pi
 import numpy as np
+from geocoding import default_geocoder
 
 # Makes an API call to the geocoding api. Returns latitude and longitude from an address
+# The client in geocoding.py handles the session, timeouts, retries, and rate limiting
 def geocode_address(address):
-    api_key = "67e16f5b9807f168073335qvo675dcd"
-    base_url = "https://geocode.maps.co/search"
-    params = {
-        "q": address, "api_key": api_key }
-    response = requests.get(base_url, params=params)
-    
-    respjson = response.json()
-    result = respjson[0]
-    latitude = float(result["lat"])
-    longitude = float(result["lon"])
-    return (latitude, longitude)
+    return default_geocoder.geocode(address)
 
 # Converts right ascension and declination into degrees
 def conv_rasc_decl(rightascension, declination):
@@ -32,7 +22,7 @@ def conv_rasc_decl(rightascension, declination):
     if declination.strip()[0] == '-' or declination.strip()[0] =='−':
         sign = -1
 
-    declination = declination.strip().lstrip("+-")
+    declination = declination.strip().lstrip("+-−")
     dec_split = declination.split()
     degrees = float(dec_split[0].replace("°", ""))
     arcminutes = float(dec_split[1].replace("′", ""))
@@ -123,3 +113,146 @@ def cartesian_conversion(alt, az):
     y = sin(radians(theta))*sin(phi)
     
     return (x,y)
+
+
+'''
+Vectorized versions of the functions above.
+These take numpy arrays, so a whole catalog (or a whole grid of sites x stars) is done in one call
+instead of looping star by star. They follow the same math as the scalar versions.
+'''
+# Bortle class to naked eye limiting magnitude
+bortle_nelm = {1: 8,
+               2: 7.5,
+               3: 7,
+               4: 6.5,
+               4.5: 6.3,
+               5: 6,
+               6: 5.5,
+               7: 5,
+               8: 4.5,
+               9: 4,}
+
+# Degrees the local siderial time moves per day
+sidereal_rate = 360.98564736629
+
+def conv_rasc_decl_arrays(rightascensions, declinations):
+    # The strings still have to be parsed one by one, so this should be done once per catalog and reused
+    degrees_list = [conv_rasc_decl(ra, dec) for ra, dec in zip(rightascensions, declinations)]
+    degrees_arr = np.array(degrees_list, dtype = float).reshape(-1, 2)
+    return degrees_arr[:, 0], degrees_arr[:, 1]
+
+def hour_angle_arrays(LST, RA):
+    return np.mod(np.subtract(LST, RA), 360)
+
+def az_alt_calc_arrays(dec, ha, lat):
+    raddec = np.radians(dec)
+    radlat = np.radians(lat)
+    out_of_range = np.abs(np.subtract(dec, lat)) > 90
+    return az_alt_calc_cached(ha, np.sin(raddec), np.cos(raddec), np.sin(radlat), np.cos(radlat), out_of_range)
+
+def az_alt_calc_cached(ha, sin_dec, cos_dec, sin_lat, cos_lat, out_of_range):
+    '''
+    Same as az_alt_calc_arrays, but with the sin/cos of declination and latitude already worked out.
+    Those never change for a star and an observer, so when only the time moves just the hour angle is new.
+    '''
+    radha = np.radians(ha)
+    
+    sine_of_alt = (sin_dec*sin_lat)+(cos_dec*cos_lat*np.cos(radha))
+    alt = np.arcsin(np.clip(sine_of_alt, -1, 1))
+    
+    # Outside of arccos's domain the scalar version uses a = 0, NaNs are swapped for 0 here to match
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        cosine_of_a = (sin_dec-(np.sin(alt)*sin_lat))/(np.cos(alt)*cos_lat)
+        a = np.nan_to_num(np.degrees(np.arccos(cosine_of_a)), nan = 0)
+    
+    az = np.where(np.sin(radha) < 0, a, 360-a)
+    
+    alt = np.where(out_of_range, 0, alt)
+    az = np.where(out_of_range, 0, az)
+    return alt, az
+
+def cartesian_conversion_arrays(alt, az):
+    # All four branches of cartesian_conversion work out to theta = 90 - az
+    theta = np.radians(90-az)
+    phi = pi/2-alt
+    
+    x = np.cos(theta)*np.sin(phi)
+    y = np.sin(theta)*np.sin(phi)
+    
+    # Stars that the scalar version sends to (100,100) are NaN here,
+    # and so are stars below the horizon, which would otherwise be mirrored back inside the circle
+    hidden = (az == 0) | (az == 360) | (alt < 0)
+    x = np.where(hidden, np.nan, x)
+    y = np.where(hidden, np.nan, y)
+    return x, y
+
+def rank_sites(catalog, sites, dt, limiting_am = 8, constellation = None):
+    '''
+    Ranks many sites at once for the same datetime.
+    sites is a dict of {name: (lat, lon)}. limiting_am is either one value or one value per site.
+    Sites are ranked by the number of visible stars, or by the number of visible stars
+    in constellation if one is given.
+    Returns a list of (name, visible count, constellation count) from best to worst.
+    '''
+    names = list(sites.keys())
+    lats = np.array([float(sites[name][0]) for name in names])
+    lons = np.array([float(sites[name][1]) for name in names])
+    
+    # Every site shares the same UTC time, so only the longitude changes the LST
+    utc = dt.astimezone(timezone.utc)
+    lsts = np.mod(get_siderial_time(utc, utc.strftime('%H:%M'), 0) + lons, 360)
+    
+    # sites x stars arrays
+    ha = hour_angle_arrays(lsts[:, None], catalog.ra[None, :])
+    alt, az = az_alt_calc_arrays(catalog.dec[None, :], ha, lats[:, None])
+    limits = np.broadcast_to(np.asarray(limiting_am, dtype = float), lats.shape)
+    visible = (alt > 0) & (catalog.mag[None, :] < limits[:, None])
+    
+    visible_count = visible.sum(axis = 1)
+    if constellation is not None:
+        members = catalog.constellation_mask(constellation)
+        constellation_count = visible[:, members].sum(axis = 1)
+    else:
+        constellation_count = np.zeros(len(names), dtype = int)
+    
+    ranking = [(name, int(v), int(c)) for name, v, c in zip(names, visible_count, constellation_count)]
+    if constellation is not None:
+        ranking.sort(key = lambda row: (row[2], row[1]), reverse = True)
+    else:
+        ranking.sort(key = lambda row: row[1], reverse = True)
+    return ranking
+
+'''
+Sky projections.
+These work on alt/az in degrees (the alt and az columns of construct_table), so switching projection
+doesn't redo any of the astronomy. All of them put the zenith in the middle and the horizon at radius 1,
+with north up and east to the right like cartesian_conversion.
+'''
+def orthographic_radius(z):
+    # Same as cartesian_conversion
+    return np.sin(z)
+
+def stereographic_radius(z):
+    return np.tan(z/2)
+
+def equal_area_radius(z):
+    return np.sin(z/2)/np.sin(pi/4)
+
+projections = {'Orthographic': orthographic_radius,
+               'Stereographic': stereographic_radius,
+               'Equal Area': equal_area_radius}
+
+def project_alt_az(alt, az, projection = 'Orthographic'):
+    z = np.radians(90 - np.asarray(alt, dtype = float))
+    radaz = np.radians(az)
+    r = projections[projection](z)
+    
+    x = r*np.sin(radaz)
+    y = r*np.cos(radaz)
+    
+    # Same stars as cartesian_conversion_arrays are hidden. Below the horizon r goes past 1
+    # (or folds back inside it for Orthographic), so those are hidden in every projection
+    hidden = (np.asarray(az) == 0) | (np.asarray(az) == 360) | (np.asarray(alt) < 0)
+    x = np.where(hidden, np.nan, x)
+    y = np.where(hidden, np.nan, y)
+    return x, y
@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+api_key = "67e16f5b9807f168073335qvo675dcd"
+# Can be pointed at a local mock server for testing
+base_url = os.environ.get('SKY_ATLAS_GEOCODE_URL', "https://geocode.maps.co/search")
+
+class GeocodingError(Exception):
+    pass
+
+class GeocodingClient:
+    def __init__(self, base_url = base_url, api_key = api_key, timeout = (3.05, 10), retries = 3,
+                 backoff = 0.5, requests_per_second = 1, pool_size = 8):
+        '''
+        Client for the geocoding api.
+        Reuses connections through one session, times out instead of hanging, retries connection errors,
+        429s, and 5xx responses with exponential backoff, and spaces requests out to stay
+        under the api's rate limit (1 request per second on the free plan).
+        '''
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.pool_size = pool_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = threading.Lock()
+        self.next_slot = 0
+
+    def wait_turn(self):
+        # Each request books the next free slot, then sleeps outside the lock until it comes
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def geocode(self, address):
+        '''
+        Returns (latitude, longitude) for an address. Raises GeocodingError if it can't be found.
+        '''
+        params = {"q": address, "api_key": self.api_key}
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2**attempt
+            self.wait_turn()
+            try:
+                response = self.session.get(self.base_url, params = params, timeout = self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay)
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.retries:
+                    response.raise_for_status()
+                # The api says how long to wait when it rate limits us
+                retry_after = response.headers.get('Retry-After', '')
+                time.sleep(float(retry_after) if retry_after.isdigit() else delay)
+                continue
+
+            response.raise_for_status()
+            results = response.json()
+            if not results:
+                raise GeocodingError(f'No results for {address}')
+            return float(results[0]["lat"]), float(results[0]["lon"])
+
+    def geocode_many(self, addresses, workers = None):
+        '''
+        Geocodes many addresses concurrently, while still keeping to the rate limit.
+        Returns a dict of {address: (lat, lon)}, with None for addresses that failed.
+        '''
+        unique = list(dict.fromkeys(addresses))
+
+        def lookup(address):
+            try:
+                return self.geocode(address)
+            except (GeocodingError, requests.RequestException, ValueError):
+                return None
+
+        with ThreadPoolExecutor(max_workers = workers or self.pool_size) as executor:
+            return dict(zip(unique, executor.map(lookup, unique)))
+
+    def close(self):
+        self.session.close()
+
+default_geocoder = GeocodingClient()
@@ -0,0 +1,86 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+class HorizonProfile:
+    def __init__(self, azimuths, altitudes, bins = 3600):
+        '''
+        Minimum altitude (degrees) a star needs to clear the trees, buildings, ridgelines, etc. at each azimuth.
+        The measured points are interpolated (wrapping around north) into a table of bins
+        evenly spaced azimuths, so checking stars is just an array lookup.
+        '''
+        azimuths = np.mod(np.asarray(azimuths, dtype = float), 360)
+        altitudes = np.asarray(altitudes, dtype = float)
+        # The measured points are kept so the profile can be saved (see save_site_profiles)
+        self.azimuths = azimuths
+        self.altitudes = altitudes
+        self.bins = bins
+        centers = (np.arange(bins) + 0.5) * 360 / bins
+        self.table = np.interp(centers, azimuths, altitudes, period = 360).astype(np.float32)
+
+    def min_alt(self, az):
+        index = (np.asarray(az, dtype = float) * (self.bins / 360)).astype(np.int64) % self.bins
+        return self.table[index]
+
+    def visible(self, alt, az):
+        '''
+        True for the stars above the profile. alt and az are in degrees
+        '''
+        return np.asarray(alt) >= self.min_alt(az)
+
+def load_profile(path, bins = 3600):
+    '''
+    Reads a csv of azimuth and minimum altitude in degrees (the first two columns, with a header row)
+    '''
+    table = pd.read_csv(path)
+    if table.shape[1] < 2 or len(table) == 0:
+        raise ValueError(f'{path} needs azimuth and altitude columns')
+    azimuths = pd.to_numeric(table.iloc[:, 0], errors = 'coerce')
+    altitudes = pd.to_numeric(table.iloc[:, 1], errors = 'coerce')
+    keep = azimuths.notna() & altitudes.notna()
+    if not keep.any():
+        raise ValueError(f'{path} has no numeric azimuth/altitude rows')
+    return HorizonProfile(azimuths[keep], altitudes[keep], bins = bins)
+
+# Profiles for each site, keyed like the table cache so nearby lookups of the same place share one
+horizon_profiles = {}
+
+def site_key(lat, lon):
+    return (round(lat, 4), round(lon, 4))
+
+def site_profile(lat, lon):
+    return horizon_profiles.get(site_key(lat, lon))
+
+def set_site_profile(lat, lon, profile):
+    # None removes the site's profile
+    if profile is None:
+        horizon_profiles.pop(site_key(lat, lon), None)
+    else:
+        horizon_profiles[site_key(lat, lon)] = profile
+
+def save_site_profiles(path):
+    '''
+    Writes every site's profile points to a json file, so loaded profiles are there again next launch.
+    Written to a temporary file first, like the session snapshot.
+    '''
+    sites = {f'{lat},{lon}': {'azimuth': profile.azimuths.tolist(), 'altitude': profile.altitudes.tolist()}
+             for (lat, lon), profile in horizon_profiles.items()}
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(sites, file)
+    os.replace(path + '.tmp', path)
+
+def load_site_profiles(path):
+    '''
+    Loads the profiles written by save_site_profiles. A missing or broken file just means no profiles.
+    '''
+    try:
+        with open(path) as file:
+            sites = json.load(file)
+        for key, points in sites.items():
+            lat, lon = (float(v) for v in key.split(','))
+            set_site_profile(lat, lon, HorizonProfile(points['azimuth'], points['altitude']))
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
@@ -0,0 +1,197 @@
+'''
+Headless latency harness for the GUI's generate path.
+
+Builds the real GUI with its window withdrawn, swaps geocoding and the Bortle lookup for
+local stand-ins, and replays a list of actions (Generate, spinbox, constellation, store/compare).
+Every action's latency, widget count, and memory are recorded, and the run fails
+(exit code 1) if any of them go over their thresholds.
+
+Usage: python latency_harness.py [--scenario actions.json] [--thresholds thresholds.json] [--repeat 3]
+On a machine with no display, run it under a virtual one, e.g. xvfb-run python latency_harness.py
+
+A scenario is a json list of actions, for example:
+[{"action": "generate", "address": "Mauna Kea, Hawaii, United States", "date": "10/19/2026", "time": "09:30pm"},
+ {"action": "spinbox", "value": 5},
+ {"action": "constellation", "name": "Orion"},
+ {"action": "store"}, {"action": "compare"}, {"action": "hide"}]
+'''
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+
+# Not on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import pandas as pd
+
+import classes
+from classes import GUI
+from light_pollution_locator import LightPollutionProvider, set_light_pollution_provider
+
+path = os.path.dirname(os.path.realpath(__file__))
+directory = path + '/datasets/star_data_clean.csv'
+
+default_scenario = [
+    {'action': 'generate', 'address': 'Mauna Kea, Hawaii, United States', 'date': '10/19/2026', 'time': '09:30pm'},
+    {'action': 'spinbox', 'value': 5},
+    {'action': 'spinbox', 'value': 3},
+    {'action': 'constellation', 'name': 'first'},
+    {'action': 'store'},
+    {'action': 'generate', 'address': 'Kiruna, Sweden', 'date': '10/19/2026', 'time': '11:00pm'},
+    {'action': 'compare'},
+    {'action': 'hide'},
+    {'action': 'generate', 'address': 'Kiruna, Sweden', 'date': '10/19/2026', 'time': '11:00pm'},
+    {'action': 'generate', 'address': 'Atacama Desert, Chile', 'date': '10/19/2026', 'time': '11:00pm', 'projected': True},
+    ]
+
+# Per action limits in milliseconds, plus limits for the whole run
+default_thresholds = {
+    'ms': {'generate': 3000, 'spinbox': 2000, 'constellation': 2000, 'store': 1500, 'compare': 500, 'hide': 1500},
+    'max_widgets': 1500,
+    'max_memory_mb': 1500,
+    }
+
+class StandInBortle(LightPollutionProvider):
+    def bortle(self, lat, lon):
+        return 4
+
+def stand_in_geocode(presets):
+    def geocode_address(address):
+        # Presets use their real coordinates, anything else gets made up coordinates that are the same every run
+        if address in presets:
+            lat, lon = presets[address]
+            return float(lat), float(lon)
+        seed = zlib.crc32(address.encode('utf8'))
+        return (seed % 13000) / 100 - 65, (seed // 13000 % 36000) / 100 - 180
+    return geocode_address
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+def memory_mb():
+    # Peak resident memory. ru_maxrss is in kilobytes on Linux and bytes on macOS
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+def set_entry(entry, text):
+    entry.configure(state = 'normal')
+    entry.delete(0, 'end')
+    entry.insert(0, text)
+
+def run_action(gui, step):
+    action = step['action']
+    if action == 'generate':
+        gui.datevar.set(0)
+        gui.timevar.set(0)
+        gui.bortle_check.set(1 if step.get('projected') else 0)
+        set_entry(gui.address_entry, step['address'])
+        set_entry(gui.date_entry_box, step['date'])
+        set_entry(gui.time_entry_box, step['time'])
+        gui.press_generate()
+    elif action == 'spinbox':
+        gui.update_spinbox(step['value'])
+    elif action == 'constellation':
+        # The dropdown values look like 'Orion : 12', 'first' picks whatever is listed first
+        values = [v for v in gui.dropdown.cget('values') if v != 'None']
+        if step['name'] != 'first':
+            values = [v for v in values if v.split(':')[0].strip() == step['name']]
+        value = values[0] if values else 'None'
+        gui.selected_constellation.set(value)
+        gui.update_dropdown(value)
+    elif action == 'store':
+        gui.store_map()
+    elif action == 'compare':
+        gui.show_comparison()
+    elif action == 'hide':
+        gui.hide_comparison()
+    else:
+        raise ValueError(f'Unknown action {action}')
+
+    # Lets Tk handle the redraws and geometry changes the action caused
+    gui.update()
+    # Big charts show a preview first and build the real chart in a later after() callback,
+    # the action isn't done until that has run too
+    while hasattr(gui, 'build_job'):
+        time.sleep(.001)
+        gui.update()
+
+def run(scenario, repeat = 1):
+    gui = GUI(pd.read_csv(directory), path)
+    # Runs shouldn't overwrite the real session snapshot
+    gui.keep_session = False
+    gui.withdraw()
+    gui.place_tk_objects()
+
+    # Stand-ins for the network lookups, and errors get recorded instead of opening a popup
+    classes.geocode_address = stand_in_geocode(gui.presets)
+    set_light_pollution_provider(StandInBortle())
+    errors = []
+    gui.show_space_error = lambda title = 'Error', message = '', width = 400: errors.append(message)
+    gui.update()
+
+    results = []
+    for round_number in range(repeat):
+        for step in scenario:
+            start = time.perf_counter()
+            run_action(gui, step)
+            ms = (time.perf_counter() - start) * 1000
+            results.append({'round': round_number, 'action': step['action'], 'ms': ms,
+                            'widgets': count_widgets(gui), 'memory_mb': memory_mb()})
+
+    gui.quit_button()
+    return results, errors
+
+def check(results, errors, thresholds):
+    failures = [f'GUI error: {message}' for message in errors]
+    for row in results:
+        limit = thresholds['ms'].get(row['action'])
+        if limit is not None and row['ms'] > limit:
+            failures.append(f"{row['action']} took {row['ms']:.0f}ms (limit {limit}ms)")
+    if results and results[-1]['widgets'] > thresholds['max_widgets']:
+        failures.append(f"{results[-1]['widgets']} widgets at the end (limit {thresholds['max_widgets']})")
+    if results and results[-1]['memory_mb'] > thresholds['max_memory_mb']:
+        failures.append(f"{results[-1]['memory_mb']:.0f}MB peak memory (limit {thresholds['max_memory_mb']}MB)")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Replay GUI actions headlessly and check their latency.')
+    parser.add_argument('--scenario', help = 'json file with a list of actions')
+    parser.add_argument('--thresholds', help = 'json file overriding the default thresholds')
+    parser.add_argument('--repeat', type = int, default = 1)
+    args = parser.parse_args()
+
+    scenario = default_scenario
+    if args.scenario:
+        with open(args.scenario) as file:
+            scenario = json.load(file)
+
+    thresholds = {key: (dict(value) if isinstance(value, dict) else value) for key, value in default_thresholds.items()}
+    if args.thresholds:
+        with open(args.thresholds) as file:
+            overrides = json.load(file)
+        thresholds['ms'].update(overrides.pop('ms', {}))
+        thresholds.update(overrides)
+
+    results, errors = run(scenario, repeat = args.repeat)
+
+    print(f"{'round':>5} {'action':>14} {'ms':>9} {'widgets':>8} {'memory MB':>10}")
+    for row in results:
+        print(f"{row['round']:>5} {row['action']:>14} {row['ms']:>9.1f} {row['widgets']:>8} {row['memory_mb']:>10.1f}")
+
+    failures = check(results, errors, thresholds)
+    for failure in failures:
+        print('FAIL:', failure)
+    if failures:
+        sys.exit(1)
+    print('All actions within thresholds')
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from time import sleep
+import os
+import json
+from abc import ABC, abstractmethod
+import numpy as np
 
 def to_the_fifth_decimal(coord): #the light pollution website requires five decimal places
     coord =  f"{(coord):.5f}" #gets five decimal places
@@ -61,4 +65,142 @@ def get_bortle(lat, lon):
     finally:
         driver.quit()
         return bort
-    
\ No newline at end of file
+    
+'''
+Light pollution providers.
+Every provider has a bortle(lat, lon) method that returns a Bortle class, or None if it doesn't know.
+The scraper above needs Chrome and the internet and takes several seconds,
+so a local raster is used first when there is one.
+'''
+path = os.path.dirname(os.path.realpath(__file__))
+default_raster = path + '/datasets/bortle_raster.npy'
+
+# Sky brightness (mag/arcsec^2) at the darkest end of each Bortle class, brightest class last
+sqm_bortle = [(21.99, 1), (21.89, 2), (21.69, 3), (20.49, 4), (19.50, 5), (18.94, 6), (18.38, 7), (17.80, 8)]
+
+class LightPollutionProvider(ABC):
+    @abstractmethod
+    def bortle(self, lat, lon):
+        pass
+
+class ScraperProvider(LightPollutionProvider):
+    '''
+    Scrapes lightpollutionmap.info with Selenium (get_bortle above)
+    '''
+    def bortle(self, lat, lon):
+        return get_bortle(lat, lon)
+
+class RasterProvider(LightPollutionProvider):
+    def __init__(self, raster_path = default_raster, sampling = 'nearest'):
+        '''
+        Looks Bortle classes up in a local grid, so it works offline and takes microseconds.
+        The grid is a .npy file that is memory mapped, so only the cells that get looked up are read.
+        Next to it is a .json file with the grid's bounds and what the values are:
+        {"lat_min": -90, "lat_max": 90, "lon_min": -180, "lon_max": 180, "kind": "bortle" or "sqm"}
+        Row 0 is the northern edge and column 0 the western edge. NaN or negative cells mean no data.
+        sampling is either 'nearest' or 'bilinear'.
+        '''
+        self.grid = np.load(raster_path, mmap_mode = 'r')
+        with open(os.path.splitext(raster_path)[0] + '.json') as file:
+            meta = json.load(file)
+        
+        self.lat_min, self.lat_max = meta['lat_min'], meta['lat_max']
+        self.lon_min, self.lon_max = meta['lon_min'], meta['lon_max']
+        self.kind = meta.get('kind', 'bortle')
+        self.sampling = sampling
+        
+        # A grid one cell tall or wide has no spacing in that direction, everything maps to its only row/column
+        rows, cols = self.grid.shape
+        self.row_scale = (rows - 1) / (self.lat_max - self.lat_min) if rows > 1 else 0
+        self.col_scale = (cols - 1) / (self.lon_max - self.lon_min) if cols > 1 else 0
+    
+    def sample(self, lat, lon):
+        rows, cols = self.grid.shape
+        row = (self.lat_max - lat) * self.row_scale
+        col = (lon - self.lon_min) * self.col_scale
+        if not (0 <= row <= rows - 1 and 0 <= col <= cols - 1):
+            return None
+        
+        if self.sampling == 'nearest':
+            value = float(self.grid[int(round(row)), int(round(col))])
+        else:
+            # The second row/column is the first one again on grids only one cell tall or wide
+            r0, c0 = min(int(row), max(rows - 2, 0)), min(int(col), max(cols - 2, 0))
+            r1, c1 = min(r0 + 1, rows - 1), min(c0 + 1, cols - 1)
+            dr, dc = row - r0, col - c0
+            value = float(float(self.grid[r0, c0])*(1-dr)*(1-dc) + float(self.grid[r0, c1])*(1-dr)*dc
+                          + float(self.grid[r1, c0])*dr*(1-dc) + float(self.grid[r1, c1])*dr*dc)
+        
+        if np.isnan(value) or value < 0:
+            return None
+        return value
+    
+    def bortle(self, lat, lon):
+        value = self.sample(float(lat), float(lon))
+        if value is None:
+            return None
+        
+        if self.kind == 'sqm':
+            for darkest, bortle in sqm_bortle:
+                if value >= darkest:
+                    return bortle
+            return 9
+        return int(round(min(max(value, 1), 9)))
+
+class FallbackProvider(LightPollutionProvider):
+    '''
+    Asks each provider in order and returns the first answer
+    '''
+    def __init__(self, providers):
+        self.providers = providers
+    
+    def bortle(self, lat, lon):
+        for provider in self.providers:
+            try:
+                bortle = provider.bortle(lat, lon)
+            except Exception:
+                bortle = None
+            if bortle is not None:
+                return bortle
+        return None
+
+def save_raster(raster_path, grid, lat_min = -90, lat_max = 90, lon_min = -180, lon_max = 180, kind = 'bortle'):
+    '''
+    Writes a grid in the format RasterProvider reads
+    '''
+    np.save(raster_path, np.asarray(grid, dtype = np.float32))
+    with open(os.path.splitext(raster_path)[0] + '.json', 'w') as file:
+        json.dump({'lat_min': lat_min, 'lat_max': lat_max, 'lon_min': lon_min, 'lon_max': lon_max, 'kind': kind}, file)
+
+def default_provider():
+    # The local raster if there is one, with the scraper as a fallback
+    if os.path.exists(default_raster):
+        return FallbackProvider([RasterProvider(default_raster), ScraperProvider()])
+    return ScraperProvider()
+
+light_pollution_provider = default_provider()
+
+def set_light_pollution_provider(provider):
+    global light_pollution_provider
+    light_pollution_provider = provider
+    bortle_cache.clear()
+
+# Bortle classes already looked up this session, keyed by coords rounded to about a kilometer.
+# Scraping takes several seconds, so anything that needs many sites should go through here
+bortle_cache = {}
+
+def bortle_key(lat, lon):
+    return (round(float(lat), 2), round(float(lon), 2))
+
+def known_bortle(lat, lon):
+    # Only what has already been looked up, None instead of scraping
+    return bortle_cache.get(bortle_key(lat, lon))
+
+def cached_bortle(lat, lon):
+    key = bortle_key(lat, lon)
+    if key not in bortle_cache:
+        bortle = light_pollution_provider.bortle(float(lat), float(lon))
+        if bortle is None:
+            raise ValueError(f'No light pollution data for {lat}, {lon}')
+        bortle_cache[key] = bortle
+    return bortle_cache[key]
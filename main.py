@@ -11,6 +11,8 @@ def main():
     
     gui = GUI(stars, path)
     gui.place_tk_objects()
+    # Picks up where the last session left off, if there is one
+    gui.restore_session()
     gui.mainloop()
     
 if __name__ == '__main__':
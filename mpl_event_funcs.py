@@ -1,4 +1,4 @@
-import mplcursors
+import numpy as np
 import matplotlib.pyplot as plt
 import webbrowser
 import tkinter as tk
@@ -8,51 +8,166 @@ base = 'https://en.wikipedia.org'
 bg = "#3c4276"
 fg = "#51568d"
 font = ("Arial Rounded MT Bold", 15)
-def onhover(sel, df = None):
-    # Getting a the index of our selector
-    index = sel.index
+def build_lookup(df):
+    '''
+    Builds the hover text, name and Wikipedia url of every star once per chart.
+    The lists are in the same order as the scatter points, so the event handlers
+    below only have to index into them.
+    '''
+    lookup = {'text': [], 'name': [], 'url': []}
+    columns = zip(df['name'], df['parent_constellation'], df['apparent_magnitude'], df['right_ascension'],
+                  df['declination'], df['distance (ly)'], df['link'])
     
-    # Pairing the selector with an annotation, which is a matplotlib object to annotate points.
-    # In this case, the pair is the link to the star
-    try: 
-        name = df.loc[index, 'name']
-        pc = df.loc[index,'parent_constellation']
-        am = df.loc[index,'apparent_magnitude']
-        ra = df.loc[index, 'right_ascension']
-        dec = df.loc[index, 'declination'].replace("′", "'").replace("″",'"')
-        dist = df.loc[index, 'distance (ly)']
-        text = f'{name}\nParent Constellation: {pc}\nApparent Magnitude: {am}\nRight Ascension: {ra}\nDeclination: {dec}\nDistance (ly): {dist}'
-        sel.annotation.set_text(text)
+    for name, pc, am, ra, dec, dist, link in columns:
+        if not isinstance(name, str):
+            name = 'Unnamed Star'
+        dec = dec.replace("′", "'").replace("″",'"')
+        # Distances are the csv's text, missing ones show as nan like they did before
+        dist = dist if isinstance(dist, str) else 'nan'
+        text = f'{name}\nParent Constellation: {pc}\nApparent Magnitude: {am:g}\nRight Ascension: {ra}\nDeclination: {dec}\nDistance (ly): {dist}'
         
-    except KeyError:
-        sel.annotation.set_text('Unnamed Star')
+        lookup['text'].append(text)
+        lookup['name'].append(name)
+        # Some stars don't have a page, those get None
+        lookup['url'].append(base + link if isinstance(link, str) else None)
     
-    # Just some simple styling
-    # The annotation object has the same kwargs as any text object in MPL
-    sel.annotation.get_bbox_patch().set(facecolor="#51568d", alpha=0.7) 
+    return lookup
+
+def open_star(url):
+    if url is not None:
+        webbrowser.open(url)
+
+class HoverLayer:
+    def __init__(self, fig, ax, scatter, lookup, radius = 8, interval = 16):
+        '''
+        Hover annotations for a scatter, drawn with blitting.
+        The chart is saved as a background image whenever the figure is drawn, and on mouse motion
+        only the annotation and a ring around the star are drawn over it, instead of redrawing the whole figure.
+        Motion events are coalesced so at most one is handled every interval ms (about the display's refresh rate).
+        radius is how close (in points) the mouse has to be to a star.
+        '''
+        self.fig = fig
+        self.ax = ax
+        self.scatter = scatter
+        self.lookup = lookup
+        self.radius = radius
+        self.interval = interval
+        
+        # animated artists are left out of normal draws, so they never end up in the saved background
+        self.annotation = ax.annotate('', xy = (0, 0), xytext = (15, 15), textcoords = 'offset points',
+                                      bbox = dict(boxstyle = 'round', facecolor = fg, alpha = 0.7),
+                                      animated = True, visible = False, zorder = 1000)
+        self.marker, = ax.plot([], [], 'o', markersize = 10, markerfacecolor = 'none', markeredgecolor = 'yellow',
+                               animated = True, visible = False, zorder = 1000)
+        
+        self.background = None
+        self.points = None
+        self.shown = None
+        self.pending = None
+        self.timer = None
+        self.timer_canvas = None
+        self.cids = [fig.canvas.mpl_connect('draw_event', self.on_draw),
+                     fig.canvas.mpl_connect('motion_notify_event', self.on_motion),
+                     fig.canvas.mpl_connect('figure_leave_event', self.on_leave)]
+    
+    def on_draw(self, event):
+        # The view or the star positions changed, so the background and the stars' pixel positions are redone
+        self.background = event.canvas.copy_from_bbox(self.fig.bbox)
+        self.points = self.ax.transData.transform(self.scatter.get_offsets())
+        if self.shown is not None:
+            self.ax.draw_artist(self.marker)
+            self.ax.draw_artist(self.annotation)
+    
+    def on_motion(self, event):
+        # Only the newest event is kept, and the timer handles it on the next frame
+        waiting = self.pending is not None
+        self.pending = event
+        if waiting:
+            return
+        if self.timer_canvas is not event.canvas:
+            self.timer = event.canvas.new_timer(interval = self.interval)
+            self.timer.single_shot = True
+            self.timer.add_callback(self.flush)
+            self.timer_canvas = event.canvas
+        self.timer.start()
+    
+    def on_leave(self, event):
+        self.pending = None
+        self.show(None, event.canvas)
+    
+    def flush(self):
+        event, self.pending = self.pending, None
+        if event is None or self.background is None:
+            return
+        
+        index = None
+        # inaxes would be the twin axes drawn over the chart, so the chart's own box is checked
+        if self.ax.bbox.contains(event.x, event.y) and len(self.points):
+            distance = np.hypot(self.points[:, 0] - event.x, self.points[:, 1] - event.y)
+            nearest = int(np.nanargmin(distance)) if not np.isnan(distance).all() else None
+            if nearest is not None and distance[nearest] <= self.radius * self.fig.dpi / 72:
+                index = nearest
+        self.show(index, event.canvas)
+    
+    def show(self, index, canvas):
+        if index == self.shown or self.background is None:
+            return
+        self.shown = index
+        
+        if index is None:
+            self.annotation.set_visible(False)
+            self.marker.set_visible(False)
+        else:
+            x, y = self.scatter.get_offsets()[index]
+            try:
+                text = self.lookup['text'][index]
+            except IndexError:
+                text = 'Unnamed Star'
+            # Stars on the right get their annotation on the left so it stays on the chart
+            right = self.points[index, 0] > self.fig.bbox.width / 2
+            self.annotation.xy = (x, y)
+            self.annotation.set_text(text)
+            self.annotation.set_position((-15, 15) if right else (15, 15))
+            self.annotation.set_horizontalalignment('right' if right else 'left')
+            self.annotation.set_visible(True)
+            self.marker.set_data([x], [y])
+            self.marker.set_visible(True)
+        
+        canvas.restore_region(self.background)
+        if index is not None:
+            self.ax.draw_artist(self.marker)
+            self.ax.draw_artist(self.annotation)
+        canvas.blit(self.fig.bbox)
+    
+    def remove(self):
+        for cid in self.cids:
+            self.fig.canvas.mpl_disconnect(cid)
+        if self.timer is not None:
+            self.timer.stop()
+        self.annotation.remove()
+        self.marker.remove()
     
 # TWO WAYS TO ADD THE CLICKABLE EVENT
 # the pick events don't actually have double click functionality
-def onpick(event, df = None):
+def onpick(event, lookup = None):
     ind = event.ind
-    webbrowser.open(base + df['link'][ind])
+    open_star(lookup['url'][ind[0]])
 #fig.canvas.mpl_connect('pick_event', onpick)
 
 # Click events do
 #Using contains to check the closest point
 #https://matplotlib.org/stable/api/_as_gen/matplotlib.axes.Axes.contains.html
-def onclick(event, plot = None, df = None):
+def onclick(event, plot = None, lookup = None):
     if event.dblclick:
         contains, index_dict = plot.contains(event)
         if contains:
             ind = index_dict['ind']
             if len(ind) > 1:
-                choose_pop_up(ind, df)
+                choose_pop_up(ind, lookup)
             else:
-                print(str(base + df.loc[ind, 'link'].values[0]))
-                webbrowser.open(base + str(df['link'][ind].values[0]))
+                open_star(lookup['url'][ind[0]])
 
-def choose_pop_up(ind_list, df):
+def choose_pop_up(ind_list, lookup):
     choose_root = ctk.CTkToplevel()
     choose_root.title('Multiple Stars Selected')
     choose_root.configure(fg_color = fg)
@@ -63,7 +178,7 @@ def choose_pop_up(ind_list, df):
     name_dict = {}
     
     for i in ind_list:
-        name_dict.update({df['name'][i]: i})
+        name_dict.update({lookup['name'][i]: i})
         
     selected = tk.StringVar(choose_root, value = list(name_dict.keys())[0])
     
@@ -77,7 +192,7 @@ def choose_pop_up(ind_list, df):
         choose_label = tk.Label(choose_root, textvariable=selected) 
         selected.set(name)
         ind = name_dict[name]
-        webbrowser.open(base + df['link'][ind])
+        open_star(lookup['url'][ind])
         choose_root.destroy()
     
     submit_button = ctk.CTkButton(choose_root, text = 'Submit', command = submit, fg_color = bg)
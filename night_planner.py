@@ -0,0 +1,110 @@
+from datetime import timedelta, timezone
+
+import numpy as np
+
+from functions import get_siderial_time, get_days_since_J2000, sidereal_rate
+
+minute = 1 / 1440
+
+def sun_altitude(days, lst, lat):
+    '''
+    Approximate altitude of the sun in degrees (good to about a degree, plenty for telling night from day).
+    days is days since J2000 and lst is the local sidereal time in degrees, both can be arrays.
+    Uses the low precision solar coordinates from the Astronomical Almanac.
+    '''
+    mean_long = np.radians(280.460 + 0.9856474*days)
+    anomaly = np.radians(357.528 + 0.9856003*days)
+    ecliptic_long = mean_long + np.radians(1.915*np.sin(anomaly) + 0.020*np.sin(2*anomaly))
+    obliquity = np.radians(23.439 - 0.0000004*days)
+
+    ra = np.arctan2(np.cos(obliquity)*np.sin(ecliptic_long), np.cos(ecliptic_long))
+    dec = np.arcsin(np.sin(obliquity)*np.sin(ecliptic_long))
+    ha = np.radians(lst) - ra
+    radlat = np.radians(lat)
+    return np.degrees(np.arcsin(np.sin(dec)*np.sin(radlat) + np.cos(dec)*np.cos(radlat)*np.cos(ha)))
+
+def constellation_members(catalog, constellation, limiting_am = 8):
+    # Catalog positions of a constellation's stars that are bright enough to count
+    return np.flatnonzero(catalog.constellation_mask(constellation) & (catalog.mag < limiting_am))
+
+def plan_windows(catalog, lat, lon, start, members, days = 30, score = 'count', coarse_minutes = 30,
+                 fine_minutes = 5, night_sun_alt = -12, keep = 0.9, count = 5):
+    '''
+    Finds the best nighttime windows to see a set of stars (catalog positions, e.g. from constellation_members)
+    from lat/lon over the days after start.
+    score is 'count' (most member stars above the horizon, higher average altitude breaks ties)
+    or 'altitude' (highest average altitude, for a single star that's just its altitude).
+
+    Every time on a coarse grid is scored against every member star in one times x stars array.
+    The best coarse time of each night is then refined on a fine grid around it, all nights together.
+    A window is the stretch of the night around that time that stays within keep of its best score.
+
+    Returns up to count dicts of start, end, best (datetimes in start's timezone), visible, altitude, and score,
+    from best to worst. Only times with the sun below night_sun_alt count as night.
+    '''
+    utc = start.astimezone(timezone.utc).replace(second = 0, microsecond = 0)
+    clock = utc.strftime('%H:%M')
+    lst0 = get_siderial_time(utc, clock, lon)
+    day0 = get_days_since_J2000(utc, clock)
+
+    members = np.asarray(members)
+    ra = np.radians(catalog.ra[members].astype(float))
+    raddec = np.radians(catalog.dec[members].astype(float))
+    sin_dec, cos_dec = np.sin(raddec), np.cos(raddec)
+    sin_lat, cos_lat = np.sin(np.radians(lat)), np.cos(np.radians(lat))
+
+    def evaluate(t):
+        # t is days after start, any shape. Returns score, visible count, and average altitude of the visible stars
+        lst = lst0 + sidereal_rate*t
+        ha = np.radians(lst)[..., None] - ra
+        alt = np.degrees(np.arcsin(np.clip(sin_dec*sin_lat + cos_dec*cos_lat*np.cos(ha), -1, 1)))
+        up = alt > 0
+        visible = up.sum(axis = -1)
+        mean_alt = np.where(up, alt, 0).sum(axis = -1) / np.maximum(visible, 1)
+        if score == 'altitude':
+            value = alt.mean(axis = -1)
+        else:
+            value = visible + mean_alt / 100
+        night = sun_altitude(day0 + t, lst, lat) < night_sun_alt
+        return np.where(night, value, -np.inf), visible, mean_alt
+
+    # Coarse pass over the whole range
+    t = np.arange(0, days, coarse_minutes * minute)
+    coarse, _, _ = evaluate(t)
+
+    # Nights run from local noon to local noon (J2000 days start at noon UTC)
+    night_id = np.floor(day0 + t + lon / 360).astype(np.int64)
+    order = np.lexsort((-coarse, night_id))
+    _, first = np.unique(night_id[order], return_index = True)
+    best = order[first]
+    best = best[coarse[best] > 0]
+    if len(best) == 0:
+        return []
+
+    # Fine pass around every night's best coarse time at once
+    offsets = np.arange(-coarse_minutes, coarse_minutes + fine_minutes, fine_minutes) * minute
+    fine_t = np.clip(t[best][:, None] + offsets[None, :], 0, days)
+    fine, fine_visible, fine_alt = evaluate(fine_t)
+    peak = np.argmax(fine, axis = 1)
+    rows = np.arange(len(best))
+
+    def when(days_after):
+        return (utc + timedelta(days = float(days_after))).astimezone(start.tzinfo)
+
+    windows = []
+    for i, coarse_index, peak_index in zip(rows, best, peak):
+        peak_score = fine[i, peak_index]
+        threshold = keep * peak_score
+        same_night = night_id == night_id[coarse_index]
+        lo = hi = coarse_index
+        while lo > 0 and same_night[lo - 1] and coarse[lo - 1] >= threshold:
+            lo -= 1
+        while hi < len(t) - 1 and same_night[hi + 1] and coarse[hi + 1] >= threshold:
+            hi += 1
+
+        windows.append({'start': when(min(t[lo], fine_t[i, peak_index])), 'end': when(max(t[hi], fine_t[i, peak_index])),
+                        'best': when(fine_t[i, peak_index]), 'visible': int(fine_visible[i, peak_index]),
+                        'altitude': float(fine_alt[i, peak_index]), 'score': float(peak_score)})
+
+    windows.sort(key = lambda window: window['score'], reverse = True)
+    return windows[:count]
@@ -0,0 +1,122 @@
+'''
+Multi-core coordinate transform for very large catalogs.
+
+The catalog's ra/dec arrays are copied into shared memory once. Worker processes attach to it
+when they start. A transform writes the row indices it needs into a shared buffer and only sends
+(start, stop, lst, lat) to each worker, so nothing else gets pickled. Every shard is written
+straight into one preallocated shared output buffer holding X, Y, alt, and az.
+'''
+import os
+import atexit
+import threading
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from functions import hour_angle_arrays, az_alt_calc_arrays, cartesian_conversion_arrays
+
+# Rows of the output buffer
+X_ROW, Y_ROW, ALT_ROW, AZ_ROW = range(4)
+
+# Set in each worker process by attach()
+worker_arrays = {}
+
+def open_shared(name):
+    # Python 3.13+ can attach without the resource tracker, which would otherwise
+    # try to clean up memory the main process owns
+    try:
+        return shared_memory.SharedMemory(name = name, track = False)
+    except TypeError:
+        return shared_memory.SharedMemory(name = name)
+
+def attach(inputs_name, indices_name, outputs_name, size):
+    inputs = open_shared(inputs_name)
+    indices = open_shared(indices_name)
+    outputs = open_shared(outputs_name)
+    worker_arrays['memory'] = (inputs, indices, outputs)
+    worker_arrays['inputs'] = np.ndarray((2, size), dtype = np.float32, buffer = inputs.buf)
+    worker_arrays['indices'] = np.ndarray((size,), dtype = np.int64, buffer = indices.buf)
+    worker_arrays['outputs'] = np.ndarray((4, size), dtype = np.float32, buffer = outputs.buf)
+
+def transform_into(outputs, ra, dec, lst, lat):
+    ha = hour_angle_arrays(lst, ra)
+    alt, az = az_alt_calc_arrays(dec, ha, lat)
+    X, Y = cartesian_conversion_arrays(alt, az)
+    outputs[X_ROW] = X
+    outputs[Y_ROW] = Y
+    outputs[ALT_ROW] = alt
+    outputs[AZ_ROW] = az
+
+def transform_shard(start, stop, lst, lat):
+    # start and stop are positions in the shared index list, output row i is for star indices[i]
+    inputs = worker_arrays['inputs']
+    rows = worker_arrays['indices'][start:stop]
+    transform_into(worker_arrays['outputs'][:, start:stop], inputs[0, rows], inputs[1, rows], lst, lat)
+    return stop - start
+
+class ParallelTransform:
+    def __init__(self, ra, dec, workers = None, shards_per_worker = 2, min_stars = 500_000):
+        '''
+        Sharded alt/az and x,y transform of the rows of a catalog a chart needs.
+        Each transform is split into shards_per_worker shards per worker, so every worker has work
+        whatever the number of rows. Transforms of fewer than min_stars rows are done in this process,
+        since handing them to workers would cost more than it saves.
+        '''
+        self.size = len(ra)
+        self.workers = workers or min(os.cpu_count() or 1, 61)
+        self.shards_per_worker = shards_per_worker
+        self.min_stars = min_stars
+        self.lock = threading.Lock()
+
+        self.inputs_memory = shared_memory.SharedMemory(create = True, size = max(1, 2 * self.size * 4))
+        self.indices_memory = shared_memory.SharedMemory(create = True, size = max(1, self.size * 8))
+        self.outputs_memory = shared_memory.SharedMemory(create = True, size = max(1, 4 * self.size * 4))
+        self.inputs = np.ndarray((2, self.size), dtype = np.float32, buffer = self.inputs_memory.buf)
+        self.indices = np.ndarray((self.size,), dtype = np.int64, buffer = self.indices_memory.buf)
+        self.outputs = np.ndarray((4, self.size), dtype = np.float32, buffer = self.outputs_memory.buf)
+        self.inputs[0] = ra
+        self.inputs[1] = dec
+
+        self.executor = None
+        if self.size >= min_stars and self.workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers = self.workers, initializer = attach,
+                                                initargs = (self.inputs_memory.name, self.indices_memory.name,
+                                                            self.outputs_memory.name, self.size))
+        atexit.register(self.close)
+
+    def transform(self, lst, lat, indices = None):
+        '''
+        Transforms the given row indices (all rows by default) for one observer and LST.
+        Only those rows are computed. Returns copies of X, Y, alt (radians), and az (degrees) in the order of indices.
+        '''
+        if indices is None:
+            indices = np.arange(self.size)
+        indices = np.asarray(indices, dtype = np.int64)
+        count = len(indices)
+
+        with self.lock:
+            if self.executor is None or count < self.min_stars:
+                outputs = np.empty((4, count), dtype = np.float32)
+                transform_into(outputs, self.inputs[0, indices], self.inputs[1, indices], lst, lat)
+                return tuple(outputs)
+
+            self.indices[:count] = indices
+            shard_size = -(-count // (self.workers * self.shards_per_worker))
+            shards = [(start, min(start + shard_size, count)) for start in range(0, count, shard_size)]
+            futures = [self.executor.submit(transform_shard, start, stop, lst, lat) for start, stop in shards]
+            for future in futures:
+                future.result()
+            return tuple(row[:count].copy() for row in self.outputs)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.inputs_memory is not None:
+            # The numpy views have to go before the memory can be closed
+            del self.inputs, self.indices, self.outputs
+            for memory in (self.inputs_memory, self.indices_memory, self.outputs_memory):
+                memory.close()
+                memory.unlink()
+            self.inputs_memory = self.indices_memory = self.outputs_memory = None
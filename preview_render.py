@@ -0,0 +1,69 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageColor
+
+fg = "#51568d"
+
+# Roughly how many preview pixels one matplotlib point covers, per pixel of preview width
+px_per_point = 1 / 430
+
+def disc_offsets(radius):
+    r = int(np.ceil(radius))
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    inside = dx**2 + dy**2 <= radius**2
+    return dy[inside], dx[inside]
+
+def splat(img, x, y, radii, color):
+    '''
+    Stamps a filled circle for every star straight into the image array.
+    Stars are grouped by radius so each group is stamped in one numpy step.
+    '''
+    size = img.shape[0]
+    cx = np.rint((np.asarray(x) + 1) / 2 * (size - 1)).astype(int)
+    cy = np.rint((1 - np.asarray(y)) / 2 * (size - 1)).astype(int)
+    radii = np.maximum(np.round(np.asarray(radii) * 2) / 2, 0.5)
+
+    for radius in np.unique(radii):
+        group = radii == radius
+        dy, dx = disc_offsets(radius)
+        py = (cy[group, None] + dy[None, :]).ravel()
+        px = (cx[group, None] + dx[None, :]).ravel()
+        inside = (py >= 0) & (py < size) & (px >= 0) & (px < size)
+        img[py[inside], px[inside]] = color
+
+def render_preview(stardf, size = 500, color = 'white', size_mult = 1, highlights = ()):
+    '''
+    Draws the chart's stars into a size x size RGB array, with the same sizes and colors as plot_stars.
+    highlights is a list of dicts like LocStarMap.highlights.
+    '''
+    img = np.zeros((size, size, 3), dtype = np.uint8)
+    scale = size * px_per_point
+
+    def layer(df, color, mult):
+        mag = df['apparent_magnitude'].to_numpy(dtype = float)
+        # matplotlib sizes are areas in points^2, so the radius goes with the square root
+        radii = np.sqrt(np.abs(mag) * mult) / 2 * scale
+        splat(img, df['X'].to_numpy(dtype = float), df['Y'].to_numpy(dtype = float), radii, ImageColor.getrgb(color))
+
+    layer(stardf, color, 2 * size_mult)
+    layer(stardf.loc[stardf['apparent_magnitude'] <= 1], color, 80 * size_mult)
+    for highlight in highlights:
+        df = highlight['df']
+        layer(df.loc[df['X'].notna()], highlight['color'], 2 * highlight['size_mult'])
+    return img
+
+def preview_image(stardf, size = 500, color = 'white', size_mult = 1, highlights = ()):
+    '''
+    The preview as a PIL image, with the same border and compass letters as the real chart
+    '''
+    margin = size // 10
+    sky = Image.fromarray(render_preview(stardf, size = size, color = color, size_mult = size_mult, highlights = highlights))
+
+    image = Image.new('RGB', (size + 2*margin, size + 2*margin), fg)
+    image.paste(sky, (margin, margin))
+
+    draw = ImageDraw.Draw(image)
+    middle = margin + size // 2
+    for letter, xy in (('N', (middle, margin // 2)), ('S', (middle, size + margin * 3 // 2)),
+                       ('W', (margin // 2, middle)), ('E', (size + margin * 3 // 2, middle))):
+        draw.text(xy, letter, fill = 'white', anchor = 'mm')
+    return image
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import queue
+import zipfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Bumped whenever the layout below changes, older snapshots are then ignored
+snapshot_version = 2
+
+def catalog_fingerprint(catalog):
+    '''
+    Hash of the catalog's index labels, names, coordinates, and magnitudes.
+    Saved positions are only used again with the exact same catalog.
+    '''
+    digest = hashlib.sha1(pd.util.hash_array(np.asarray(catalog.index)).tobytes())
+    for array in (catalog.ra, catalog.dec, catalog.mag):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(catalog.names.buffer)
+    return digest.hexdigest()
+
+def map_state(map, catalog, prefix, arrays):
+    '''
+    The parts of a charted LocStarMap needed to show it again without recomputing anything.
+    Its star positions go into arrays (under prefix) and the rest is returned for the json file.
+    '''
+    stardf = map.stardf
+    arrays[f'{prefix}_positions'] = pd.Index(catalog.index).get_indexer(stardf['index']).astype(np.int64)
+    for column in ('X', 'Y', 'alt', 'az'):
+        arrays[f'{prefix}_{column}'] = stardf[column].to_numpy(dtype = np.float32)
+
+    bortle = getattr(map, 'bortle', None)
+    if bortle is not None:
+        bortle = float(bortle)
+        bortle = int(bortle) if bortle.is_integer() else bortle
+    highlighted = [str(h['df']['parent_constellation'].iloc[0]) for h in map.highlights if len(h['df'])]
+
+    return {'address': map.address, 'date': map.dt.strftime('%m/%d/%Y'), 'time': map.dt.strftime('%I:%M%p'),
+            'lat': float(map.lat), 'lon': float(map.lon), 'bortle': bortle, 'projection': map.projection,
+            'highlight': highlighted[0] if highlighted else None}
+
+def save_snapshot(directory, state, arrays):
+    '''
+    Writes session.json and session.npz. Each is written to a temporary file first,
+    so quitting halfway through never leaves a broken snapshot behind.
+    '''
+    os.makedirs(directory, exist_ok = True)
+    with open(os.path.join(directory, 'session.npz.tmp'), 'wb') as file:
+        np.savez(file, **arrays)
+    with open(os.path.join(directory, 'session.json.tmp'), 'w') as file:
+        json.dump(state, file)
+    os.replace(os.path.join(directory, 'session.npz.tmp'), os.path.join(directory, 'session.npz'))
+    os.replace(os.path.join(directory, 'session.json.tmp'), os.path.join(directory, 'session.json'))
+
+def load_snapshot(directory, catalog):
+    '''
+    Returns (state, arrays) from the last save_snapshot, or None if there isn't a usable one.
+    The position arrays are left out if the catalog has changed since.
+    '''
+    try:
+        with open(os.path.join(directory, 'session.json')) as file:
+            state = json.load(file)
+        if state.get('version') != snapshot_version:
+            return None
+        with np.load(os.path.join(directory, 'session.npz')) as data:
+            arrays = dict(data)
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return None
+
+    if state.get('catalog') != catalog_fingerprint(catalog):
+        arrays = {}
+    return state, arrays
+
+def snapshot_table(catalog, arrays, prefix):
+    '''
+    Rebuilds a construct_table style table from saved positions, or None if they weren't saved.
+    X/Y are as they were on the chart (its projection, with its horizon mask), and stars that never
+    rise at the site aren't in it, since the chart's stardf doesn't keep them.
+    '''
+    if f'{prefix}_positions' not in arrays:
+        return None
+    positions = arrays[f'{prefix}_positions']
+    if len(positions) and (positions.min() < 0 or positions.max() >= len(catalog)):
+        return None
+    return catalog.frame(positions, X = arrays[f'{prefix}_X'], Y = arrays[f'{prefix}_Y'],
+                         ra_deg = catalog.ra[positions], dec_deg = catalog.dec[positions],
+                         alt = arrays[f'{prefix}_alt'], az = arrays[f'{prefix}_az'])
+
+class SessionValidator(threading.Thread):
+    def __init__(self, address, lat, lon, geocode, bortle_lookup = None):
+        '''
+        Checks a restored chart against fresh lookups, off the Tk thread.
+        The address is geocoded again and, if bortle_lookup is given, the Bortle class is looked up again.
+        Puts (lat, lon, bortle) on self.result when done. Lookups that fail keep the snapshot's values
+        (bortle is None if it couldn't be checked).
+        '''
+        super().__init__(daemon = True)
+        self.address = address
+        self.lat = lat
+        self.lon = lon
+        self.geocode = geocode
+        self.bortle_lookup = bortle_lookup
+        self.result = queue.Queue()
+
+    def run(self):
+        lat, lon = self.lat, self.lon
+        try:
+            lat, lon = self.geocode(self.address)
+        except Exception:
+            # Offline or the api is down, the snapshot's coords are still good
+            pass
+
+        bortle = None
+        if self.bortle_lookup is not None:
+            try:
+                bortle = self.bortle_lookup(lat, lon)
+            except Exception:
+                pass
+        self.result.put((lat, lon, bortle))
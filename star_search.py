@@ -0,0 +1,75 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class NameIndex:
+    def __init__(self, names):
+        '''
+        Search index over star names.
+        names is indexable by catalog position (a list or PackedStrings), unnamed stars are None.
+        Names are kept sorted for prefix lookups with bisect, and every three letter piece
+        of a name points to the names containing it, for matches in the middle of a name.
+        '''
+        self.names = names
+        keyed = sorted((names[i].lower(), i) for i in range(len(names)) if names[i])
+        self.keys = [key for key, _ in keyed]
+        self.ids = np.array([i for _, i in keyed], dtype = np.int64)
+
+        # Posting lists hold positions in self.keys, built in order so they come out sorted
+        postings = defaultdict(list)
+        for order, key in enumerate(self.keys):
+            for trigram in trigrams(key):
+                postings[trigram].append(order)
+        self.postings = {trigram: np.array(orders, dtype = np.int32) for trigram, orders in postings.items()}
+
+    def search(self, query, limit = 10):
+        '''
+        Returns up to limit (name, catalog position) pairs.
+        Names starting with the query come first, then names that contain it.
+        '''
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        lo = bisect_left(self.keys, query)
+        hi = bisect_left(self.keys, query + '\uffff')
+        orders = list(range(lo, min(hi, lo + limit)))
+
+        if len(orders) < limit and len(query) >= 3:
+            lists = [self.postings.get(trigram) for trigram in trigrams(query)]
+            if all(orders_list is not None for orders_list in lists):
+                orders += self.containing(query, lists, lo, hi, limit - len(orders))
+
+        return [(self.names[self.ids[order]], int(self.ids[order])) for order in orders]
+
+    def containing(self, query, lists, lo, hi, limit):
+        '''
+        Up to limit positions of names containing query but not starting with it (those are lo:hi).
+        lists are the posting lists of the query's trigrams. The smallest one is walked in growing chunks,
+        each chunk is checked against the other lists with binary searches, and the walk stops
+        as soon as there are enough matches, so long posting lists are never read in full.
+        '''
+        lists = sorted(lists, key = len)
+        smallest, others = lists[0], lists[1:]
+        found = []
+        start, step = 0, 4 * limit
+        while start < len(smallest) and len(found) < limit:
+            chunk = smallest[start:start + step]
+            for orders_list in others:
+                at = np.minimum(np.searchsorted(orders_list, chunk), len(orders_list) - 1)
+                chunk = chunk[orders_list[at] == chunk]
+            for order in chunk:
+                if lo <= order < hi:
+                    continue
+                # Trigrams can all match without the whole query being in the name
+                if query in self.keys[order]:
+                    found.append(int(order))
+                    if len(found) == limit:
+                        break
+            start += step
+            step *= 2
+        return found
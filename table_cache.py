@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+class TableCache:
+    def __init__(self, max_bytes = 64 * 1024**2):
+        '''
+        Least recently used cache of construct_table results.
+        Tables are keyed by the observer, UTC minute, and limiting magnitude, and the oldest
+        ones are dropped once the tables together use more than max_bytes.
+        Cached tables are shared, so they should not be changed in place.
+        Safe to use from several threads, tables are computed outside of the lock.
+        '''
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.tables = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, map, am):
+        # Coords are rounded to about 10m so geocoding the same place twice still matches
+        return (round(map.lat, 4), round(map.lon, 4), map.dt.strftime('%Y-%m-%d'), map.time, float(am))
+
+    def get_table(self, map, catalog, am):
+        '''
+        Returns map.construct_table(catalog, am), computing it only if it isn't cached
+        '''
+        key = self.key(map, am)
+        with self.lock:
+            if key in self.tables:
+                self.hits += 1
+                self.tables.move_to_end(key)
+                return self.tables[key]
+            self.misses += 1
+
+        table = map.construct_table(catalog, am = am)
+        self.put(key, table)
+        return table
+
+    def put(self, key, table):
+        size = int(table.memory_usage(deep = True).sum())
+        with self.lock:
+            self.store(key, table, size)
+
+    def store(self, key, table, size):
+        if key in self.tables:
+            self.total_bytes -= self.sizes.pop(key)
+            del self.tables[key]
+
+        self.tables[key] = table
+        self.sizes[key] = size
+        self.total_bytes += size
+
+        # Always keeps the newest table, even if it is bigger than the limit on its own
+        while self.total_bytes > self.max_bytes and len(self.tables) > 1:
+            old_key, _ = self.tables.popitem(last = False)
+            self.total_bytes -= self.sizes.pop(old_key)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'tables': len(self.tables), 'bytes': self.total_bytes}